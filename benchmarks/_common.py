@@ -0,0 +1,73 @@
+"""Shared helpers for the JSON-emitting benchmarks (bench_micro, loadgen, compare)."""
+import json
+import os
+import platform
+import subprocess
+import sys
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def git_revision() -> str | None:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, timeout=5
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    return out.stdout.strip() or None
+
+
+def environment() -> dict:
+    """What a result was measured on; compare.py warns when two results differ here."""
+    return {
+        "commit": git_revision(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def latency_summary(seconds: list[float]) -> dict:
+    """Count, mean and exact p50/p95/p99/max of a list of durations, in milliseconds."""
+    if not seconds:
+        return {"count": 0}
+    ms = np.asarray(seconds) * 1000
+    p50, p95, p99 = np.percentile(ms, (50, 95, 99))
+    return {
+        "count": len(ms),
+        "mean_ms": round(float(ms.mean()), 6),
+        "p50_ms": round(float(p50), 6),
+        "p95_ms": round(float(p95), 6),
+        "p99_ms": round(float(p99), 6),
+        "max_ms": round(float(ms.max()), 6),
+    }
+
+
+def parse_size(text: str) -> int:
+    """'512', '64k', '4m' -> bytes."""
+    text = text.strip().lower()
+    scale = {"k": 1024, "m": 1024 * 1024, "g": 1024 * 1024 * 1024}.get(text[-1:], 1)
+    return int(float(text[:-1] if scale > 1 else text) * scale)
+
+
+def parse_weights(spec: str, parse_key=str) -> dict:
+    """'4k:0.6,64k:0.3,1m:0.1' -> {key: weight}; a bare key gets weight 1."""
+    weights = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        key, _, weight = item.partition(":")
+        weights[parse_key(key)] = float(weight or 1)
+    return weights
+
+
+def write_result(result: dict, path: str | None) -> None:
+    text = json.dumps(result, indent=2, sort_keys=True)
+    if path and path != "-":
+        with open(path, "w") as f:
+            f.write(text + "\n")
+        print(f"wrote {path}", file=sys.stderr)
+    else:
+        print(text)
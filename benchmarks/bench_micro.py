@@ -0,0 +1,122 @@
+"""Micro-benchmarks for the per-request hot spots, emitted as JSON.
+
+    python benchmarks/bench_micro.py [--sizes 4k,256k,4m] [--min-time 1] [--json out.json]
+
+Covers behavioral_analysis (per artifact size), classify_verdict,
+generate_soc_noise, render_report_html (cache misses) and store_report
+(PRECLEAR_STORAGE backend, default memory, in a temp directory). Every case
+reports calls/s and p50/p95/p99 per call; cheap calls are timed in batches,
+so their percentiles are of batch means. Compare two runs with compare.py.
+"""
+import argparse
+import asyncio
+import io
+import itertools
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("PRECLEAR_STORAGE", "memory")
+os.environ.setdefault("PRECLEAR_DATA_DIR", tempfile.mkdtemp(prefix="preclear-bench-"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+
+import main  # noqa: E402
+from _common import environment, latency_summary, parse_size, write_result  # noqa: E402
+
+MIN_SAMPLES = 20
+BATCH_SECONDS = 0.0002  # calls faster than this are timed in batches
+
+
+def synthetic_artifact(size: int, rng: np.random.Generator) -> bytes:
+    """Half random bytes, half script-like text with a few indicator tokens."""
+    text = b"Set shell = CreateObject(\"WScript.Shell\")\npowershell -nop -w hidden\nhttp://203.0.113.9/a\n"
+    half = size // 2
+    body = rng.integers(0, 256, half, dtype=np.uint8).tobytes()
+    return body + (text * (half // len(text) + 1))[: size - half]
+
+
+def measure(fn, args, min_time: float) -> dict:
+    args = itertools.cycle(args)
+    started = time.perf_counter()
+    fn(next(args))  # warm-up, and an estimate for the batch size
+    single = time.perf_counter() - started
+    inner = max(1, int(BATCH_SECONDS / single)) if single > 0 else 1000
+    samples = []
+    started = time.perf_counter()
+    while time.perf_counter() - started < min_time or len(samples) < MIN_SAMPLES:
+        t0 = time.perf_counter()
+        for _ in range(inner):
+            fn(next(args))
+        samples.append((time.perf_counter() - t0) / inner)
+    calls = len(samples) * inner
+    return {
+        "calls": calls,
+        "batch": inner,
+        "calls_per_second": round(len(samples) / sum(samples), 2),
+        **latency_summary(samples),
+    }
+
+
+def build_reports(count: int, rng: np.random.Generator) -> list[dict]:
+    async def build():
+        reports = []
+        for i in range(count):
+            data = synthetic_artifact(16 * 1024, rng)
+            artifact = main.ingest_stream(io.BytesIO(data), f"sample-{i}.bin")
+            reports.append(await main.build_report(artifact, wait=True, seed=i))
+            artifact.close()
+        return reports
+
+    return asyncio.run(build())
+
+
+def main_() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="4k,256k,4m", help="artifact sizes for behavioral_analysis")
+    parser.add_argument("--min-time", type=float, default=1.0, help="seconds per case")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="write the result here instead of stdout")
+    args = parser.parse_args()
+    rng = np.random.default_rng(args.seed)
+
+    results = {}
+
+    def case(name, fn, inputs):
+        results[name] = measure(fn, inputs, args.min_time)
+        r = results[name]
+        print(f"{name:<32} {r['calls_per_second']:>12.1f} calls/s  p50 {r['p50_ms']:.4f} ms  p99 {r['p99_ms']:.4f} ms",
+              file=sys.stderr)
+
+    for size in (parse_size(s) for s in args.sizes.split(",")):
+        case(f"behavioral_analysis[{size}]", main.behavioral_analysis, [synthetic_artifact(size, rng)])
+
+    case("classify_verdict", lambda risk: main.classify_verdict(risk, False), list(range(101)))
+    case("generate_soc_noise", lambda seed: main.generate_soc_noise(seed).summary(), list(range(1000)))
+
+    reports = build_reports(64, rng)
+    # A one-entry cache misses on every call while cycling through 64 reports.
+    main.RENDER_CACHE = main.BoundedCache(max_entries=1)
+    case("render_report_html", main.render_report_html, reports)
+
+    ids = itertools.count()
+    loop = asyncio.new_event_loop()
+    case(f"store_report[{main.STORAGE_BACKEND}]",
+         lambda report: loop.run_until_complete(main.store_report({**report, "report_id": f"bench{next(ids):011d}"})),
+         reports)
+    loop.close()
+    if main.REPORT_BACKEND is not None and hasattr(main.REPORT_BACKEND, "flush"):
+        main.REPORT_BACKEND.flush()
+
+    write_result({
+        "benchmark": "micro",
+        "environment": environment(),
+        "config": {"sizes": args.sizes, "min_time": args.min_time, "seed": args.seed, "storage": main.STORAGE_BACKEND},
+        "results": results,
+    }, args.json)
+
+
+if __name__ == "__main__":
+    main_()
@@ -0,0 +1,61 @@
+"""Report render throughput for reports with many flags and SOC alerts.
+
+    python benchmarks/bench_render.py [--reports 200] [--rounds 20]
+"""
+import argparse
+import os
+import sys
+import time
+
+os.environ.setdefault("PRECLEAR_STORAGE", "memory")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+
+
+def make_report(i: int, flags: int, alerts: int) -> dict:
+    soc = main.generate_soc_noise(i, count=alerts)
+    return {
+        "report_id": f"bench-{i:06d}",
+        "created_at": "2026-01-01 00:00:00 UTC",
+        "filename": f"invoice_<{i}>.docm",
+        "verdict": ("ALLOWED", "QUARANTINED", "BLOCKED")[i % 3],
+        "rationale": "Behavioral correlation exceeded quarantine threshold & signals agree.",
+        "final_risk": i % 101,
+        "deception_triggered": i % 5 == 0,
+        "behavior_score": (i * 7) % 101,
+        "flags": [f"Suspicious token <{j}> observed in macro stream" for j in range(flags)],
+        "steps": [f"Stage {j}: completed" for j in range(8)],
+        "soc_alerts": soc.rows(main.SOC_SAMPLE_ROWS),
+        "soc_summary": soc.summary(),
+    }
+
+
+def run(label: str, reports: list, rounds: int) -> None:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for report in reports:
+            main.render_report_html(report)
+    elapsed = time.perf_counter() - start
+    n = rounds * len(reports)
+    print(f"{label:<8} {n / elapsed:>10.0f} renders/s {elapsed / n * 1e6:>8.1f} us/render")
+
+
+def main_() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--reports", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--flags", type=int, default=40)
+    parser.add_argument("--alerts", type=int, default=120)
+    args = parser.parse_args()
+
+    reports = [make_report(i, args.flags, args.alerts) for i in range(args.reports)]
+    # A one-entry cache misses on every report; a large one hits after the first round.
+    main.RENDER_CACHE = main.BoundedCache(max_entries=1)
+    run("cold", reports, args.rounds)
+    main.RENDER_CACHE = main.BoundedCache(max_entries=args.reports)
+    run("warm", reports, args.rounds)
+
+
+if __name__ == "__main__":
+    main_()
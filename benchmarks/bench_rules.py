@@ -0,0 +1,39 @@
+"""Signature rule matching throughput over random and text-like artifacts.
+
+    python benchmarks/bench_rules.py [--mb 64]
+"""
+import argparse
+import os
+import sys
+import time
+
+os.environ.setdefault("PRECLEAR_STORAGE", "memory")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+
+
+def run(label: str, data: bytes, ruleset) -> None:
+    scanner = ruleset.scanner()
+    start = time.perf_counter()
+    for i in range(0, len(data), main.CHUNK_SIZE):
+        scanner.update(data[i:i + main.CHUNK_SIZE])
+    hits = [hit["rule"] for hit in scanner.finish()]
+    elapsed = time.perf_counter() - start
+    print(f"{label:<8} {len(data) / elapsed / 1e6:>8.1f} MB/s  hits={hits}")
+
+
+def main_() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mb", type=int, default=64)
+    args = parser.parse_args()
+    size = args.mb * 1024 * 1024
+    print(f"{len(main.RULES)} rules, {len(main.RULES.strings)} strings")
+    run("random", os.urandom(size), main.RULES)
+    text = b"Lorem ipsum dolor sit amet, consectetur adipiscing elit. Set shell = nothing\n"
+    run("text", (text * (size // len(text)))[:size], main.RULES)
+    run("planted", os.urandom(size - 64) + b"mimikatz sekurlsa::logonpasswords", main.RULES)
+
+
+if __name__ == "__main__":
+    main_()
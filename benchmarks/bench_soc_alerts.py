@@ -0,0 +1,50 @@
+"""Synthetic SOC alert generation and tool x severity aggregation throughput.
+
+    python benchmarks/bench_soc_alerts.py [--alerts 5000000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault("PRECLEAR_STORAGE", "memory")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+
+
+def per_alert_dicts(count: int, seed: int) -> dict:
+    # The previous shape: one dict per alert, counted in Python.
+    rng = random.Random(seed)
+    severities = ["Low", "Medium", "Medium", "High", "Low", "Medium"]
+    alerts = [
+        {"tool": rng.choice(main.SOC_TOOLS), "sev": rng.choice(severities), "title": rng.choice(main.SOC_TITLES)}
+        for _ in range(count)
+    ]
+    return main.summarize_alert_dicts(alerts)
+
+
+def columnar(count: int, seed: int) -> dict:
+    return main.generate_soc_noise(seed, count=count).summary()
+
+
+def run(label: str, fn, count: int) -> None:
+    start = time.perf_counter()
+    summary = fn(count, 1)
+    elapsed = time.perf_counter() - start
+    assert summary["total"] == count
+    print(f"{label:<10} {count:>10} alerts {elapsed:>8.3f} s {count / elapsed / 1e6:>8.2f} M alerts/s")
+
+
+def main_() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--alerts", type=int, default=5_000_000)
+    parser.add_argument("--dict-alerts", type=int, default=500_000)
+    args = parser.parse_args()
+    run("dicts", per_alert_dicts, args.dict_alerts)
+    run("columnar", columnar, args.alerts)
+
+
+if __name__ == "__main__":
+    main_()
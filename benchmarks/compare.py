@@ -0,0 +1,73 @@
+"""Compare two JSON results from bench_micro.py or loadgen.py.
+
+    python benchmarks/compare.py base.json new.json [--threshold 0.10]
+
+Prints the relative change of every throughput and p50/p95/p99 figure and
+exits 1 if any got worse by more than --threshold (a fraction). Results from
+different machines or Python/NumPy versions are compared anyway, with a warning.
+"""
+import argparse
+import json
+import sys
+
+LATENCY_KEYS = ("p50_ms", "p95_ms", "p99_ms")
+THROUGHPUT_KEYS = ("calls_per_second", "requests_per_second")
+
+
+def figures(result: dict) -> dict[str, float]:
+    """Flatten a result into {"case.metric": value} for the compared metrics."""
+    if result.get("benchmark") == "load":
+        cases = {"overall": {**result["overall"], "requests_per_second": result["requests_per_second"]}}
+        cases.update(result["endpoints"])
+    else:
+        cases = result["results"]
+    return {
+        f"{case}.{key}": values[key]
+        for case, values in cases.items()
+        for key in THROUGHPUT_KEYS + LATENCY_KEYS
+        if key in values
+    }
+
+
+def main_() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("base")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=0.10)
+    args = parser.parse_args()
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+
+    if base.get("benchmark") != new.get("benchmark"):
+        print(f"cannot compare a {base.get('benchmark')} result with a {new.get('benchmark')} result", file=sys.stderr)
+        return 2
+    for key in ("cpus", "python", "numpy", "platform"):
+        if base["environment"].get(key) != new["environment"].get(key):
+            print(f"warning: {key} differs ({base['environment'].get(key)} vs {new['environment'].get(key)})",
+                  file=sys.stderr)
+    if base.get("config") != new.get("config"):
+        print("warning: the runs used different settings", file=sys.stderr)
+
+    before, after = figures(base), figures(new)
+    regressions = []
+    print(f"{'metric':<44} {base['environment'].get('commit') or 'base':>12} {new['environment'].get('commit') or 'new':>12}  change")
+    for name in sorted(before.keys() & after.keys()):
+        old, cur = before[name], after[name]
+        if not old:
+            continue
+        change = (cur - old) / old
+        # Lower is better for latency, higher for throughput.
+        worse = change > args.threshold if name.endswith(LATENCY_KEYS) else change < -args.threshold
+        if worse:
+            regressions.append(name)
+        print(f"{name:<44} {old:>12.4g} {cur:>12.4g}  {change:+7.1%}{'  REGRESSION' if worse else ''}")
+    if regressions:
+        print(f"{len(regressions)} metric(s) regressed by more than {args.threshold:.0%}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_())
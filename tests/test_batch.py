@@ -0,0 +1,98 @@
+"""Error handling of /api/v1/analyze/batch for bundles and multi-file uploads."""
+import io
+import tarfile
+import zipfile
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+client = TestClient(main.app)
+
+
+def make_zip(members: dict, compression=zipfile.ZIP_DEFLATED) -> bytes:
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", compression) as z:
+        for name, data in members.items():
+            z.writestr(name, data)
+    return buf.getvalue()
+
+
+def corrupt_first_member(bundle: bytes, name: bytes) -> bytes:
+    data = bytearray(bundle)
+    start = data.index(name) + len(name) + 16  # into the member's compressed data
+    data[start:start + 32] = b"\xff" * 32
+    return bytes(data)
+
+
+def post_bundle(data: bytes, filename: str = "bundle.zip"):
+    return client.post("/api/v1/analyze/batch", files={"bundle": (filename, data)})
+
+
+MEMBERS = {"a.txt": b"first member " * 2000, "b.txt": b"second member " * 2000}
+
+
+def test_bundle_members_are_analysed():
+    r = post_bundle(make_zip(MEMBERS))
+    assert r.status_code == 200
+    assert r.json()["analysed"] == 2
+
+
+def test_tar_gz_bundle():
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w:gz") as t:
+        for name, data in MEMBERS.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            t.addfile(info, io.BytesIO(data))
+    r = post_bundle(buf.getvalue(), "bundle.tar.gz")
+    assert r.status_code == 200
+    assert r.json()["analysed"] == 2
+
+
+@pytest.mark.parametrize("compression", [zipfile.ZIP_DEFLATED, zipfile.ZIP_BZIP2, zipfile.ZIP_LZMA])
+def test_corrupt_member_is_reported_per_member(compression):
+    r = post_bundle(corrupt_first_member(make_zip(MEMBERS, compression), b"a.txt"))
+    assert r.status_code == 200
+    body = r.json()
+    assert [x["filename"] for x in body["results"]] == ["a.txt", "b.txt"]
+    assert "error" in body["results"][0]
+    assert body["analysed"] == 1
+
+
+def test_corrupt_xz_tar_bundle():
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w:xz") as t:
+        info = tarfile.TarInfo("a.txt")
+        info.size = len(MEMBERS["a.txt"])
+        t.addfile(info, io.BytesIO(MEMBERS["a.txt"]))
+    data = bytearray(buf.getvalue())
+    data[len(data) // 2:len(data) // 2 + 16] = b"\x00" * 16
+    r = post_bundle(bytes(data), "bundle.tar.xz")
+    assert r.status_code in (200, 400)
+
+
+def test_not_an_archive():
+    r = post_bundle(b"plain text, not an archive" * 40, "notes.txt")
+    assert r.status_code == 400
+
+
+def test_bundle_member_limit(monkeypatch):
+    monkeypatch.setattr(main, "BATCH_MAX_ARTIFACTS", 1)
+    r = post_bundle(make_zip(MEMBERS))
+    results = r.json()["results"]
+    assert len(results) == 2
+    assert "bundle expansion stopped" in results[1]["error"]
+
+
+def test_uploads_over_the_limit_are_reported(monkeypatch):
+    monkeypatch.setattr(main, "BATCH_MAX_ARTIFACTS", 2)
+    files = [("files", (f"f{i}.txt", f"note {i}".encode())) for i in range(3)]
+    r = client.post("/api/v1/analyze/batch", files=files)
+    assert r.status_code == 200
+    body = r.json()
+    assert body["count"] == 3
+    assert body["analysed"] == 2
+    assert body["results"][2]["filename"] == "f2.txt"
+    assert "not analysed" in body["results"][2]["error"]
@@ -0,0 +1,229 @@
+"""Parser and matcher tests for the signature rule engine."""
+import os
+
+import pytest
+
+import main
+from main import RuleSet, RuleSyntaxError, _regex_atom, parse_rules
+
+RULES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "rules")
+
+
+def scan(rules_text: str, *chunks: bytes) -> list[str]:
+    scanner = RuleSet(parse_rules(rules_text)).scanner()
+    for chunk in chunks:
+        scanner.update(chunk)
+    return [hit["rule"] for hit in scanner.finish()]
+
+
+def one_string_rule(spec: str) -> str:
+    return f"""
+rule R
+{{
+    strings:
+        $a = {spec}
+    condition:
+        $a
+}}
+"""
+
+
+# --- _regex_atom ------------------------------------------------------------------
+
+@pytest.mark.parametrize("pattern, atom", [
+    (r"abc", b"abc"),
+    (r"ab+cd", b"ab"),
+    (r"xa?bcd", b"bcd"),
+    (r"ab*cdef", b"cdef"),
+    (r"a{2}bcd", b"bcd"),
+    (r"foo[0-9]+barbaz", b"barbaz"),
+    (r"foo\.exe", b"foo.exe"),
+    (r"\bcmd\s+/c", b"cmd"),
+    (r"(abcdef)?xy", b"xy"),
+    (r"(\-\-\-\-)?ab", b"ab"),
+    (r"(a(\.\.\.\.)b)xy", b"xy"),
+    (r"one|two", b""),
+    (r"\x41\x42", b""),
+    (r"\x41\x42cd", b"cd"),
+    (r"\0123ab", b"3ab"),
+    (r"(a)\1xyz", b"xyz"),
+    (r"café", b""),
+])
+def test_regex_atom(pattern, atom):
+    assert _regex_atom(pattern) == atom
+
+
+def test_regex_atom_is_contained_in_every_match():
+    import re
+    for pattern, text in [(r"(\-\-\-\-)?abc", b"zzz abc zzz"), (r"x(y\.z)*\.q", b"x.q")]:
+        assert re.search(pattern.encode(), text)
+        assert _regex_atom(pattern) in text
+
+
+# --- parser -----------------------------------------------------------------------
+
+def test_parse_rule_fields():
+    (rule,) = parse_rules("""
+// comment lines are ignored
+rule Sample : script network
+{
+    meta:
+        description = "A sample rule"
+        score = 15
+    strings:
+        $text = "Hello\\x00World" nocase
+        $hex = { 4D 5A ?? 00 }
+        $re = /evil[0-9]+\\.exe/i
+    condition:
+        $text or ($hex and $re)
+}
+""")
+    assert rule.name == "Sample"
+    assert rule.tags == ["script", "network"]
+    assert rule.description == "A sample rule"
+    assert rule.score == 15
+    text, hex_, regex = rule.strings
+    assert text.literal == b"hello\x00world" and text.nocase
+    assert hex_.literal is None and hex_.regex is not None and hex_.length == 4
+    assert regex.atom == b"evil" and regex.nocase
+
+
+def test_parse_defaults():
+    (rule,) = parse_rules(one_string_rule('"abc"'))
+    assert rule.description == "R"
+    assert rule.score == 10
+    assert rule.tags == []
+
+
+@pytest.mark.parametrize("text, message", [
+    ("rule R { condition: true }", "cannot parse"),
+    ("rule R\n{\n    strings:\n        $a = \"ab\"\n}\n", "missing condition"),
+    (one_string_rule('"a"'), "at least 2 bytes"),
+    (one_string_rule('"a\\qb"'), "unknown escape"),
+    (one_string_rule('"\\xZZab"'), "bad \\\\x escape"),
+    (one_string_rule("{ 4D ?? }"), "two adjacent fixed bytes"),
+    (one_string_rule("{ 4D 5 }"), "whole bytes"),
+    (one_string_rule("/ab(/"), "R \\$a"),
+    (one_string_rule("abc"), "expected"),
+    ("rule R\n{\n    meta:\n        score = high\n    condition:\n        true\n}\n", "score must be an integer"),
+    ("rule R\n{\n    strings:\n        $a = \"ab\"\n        $a = \"cd\"\n    condition:\n        $a\n}\n", "duplicate"),
+    ("rule R\n{\n    strings:\n        $a = \"ab\"\n    condition:\n        $b\n}\n", "undefined \\$b"),
+    ("rule R\n{\n    strings:\n        $a = \"ab\"\n    condition:\n        $a and\n}\n", "unexpected None"),
+    ("rule R\n{\n    strings:\n        $a = \"ab\"\n    condition:\n        $a $a\n}\n", "trailing"),
+])
+def test_parse_errors(text, message):
+    with pytest.raises(RuleSyntaxError, match=message):
+        parse_rules(text)
+
+
+def test_duplicate_rule_names():
+    with pytest.raises(RuleSyntaxError, match="duplicate rule name"):
+        RuleSet(parse_rules(one_string_rule('"ab"') * 2))
+
+
+def test_shipped_rules_parse():
+    ruleset = main.load_rules(RULES_DIR)
+    assert len(ruleset) > 0
+
+
+# --- conditions -------------------------------------------------------------------
+
+CONDITIONS = """
+rule C
+{
+    strings:
+        $a1 = "alpha"
+        $a2 = "apple"
+        $b = "bravo"
+        $c = "charlie"
+    condition:
+        %s
+}
+"""
+
+
+@pytest.mark.parametrize("condition, text, expected", [
+    ("$a1 and $b", b"alpha bravo", True),
+    ("$a1 and $b", b"alpha", False),
+    ("$a1 or $b", b"bravo", True),
+    ("not $c", b"alpha", True),
+    ("not $c", b"charlie", False),
+    ("any of ($a*)", b"apple", True),
+    ("all of ($a*)", b"apple", False),
+    ("all of ($a*)", b"apple alpha", True),
+    ("2 of them", b"alpha charlie", True),
+    ("2 of them", b"charlie", False),
+    ("2 of ($a1, $b, $c)", b"bravo charlie", True),
+    ("$c or ($a1 and not $b)", b"alpha", True),
+    ("$c or ($a1 and not $b)", b"alpha bravo", False),
+    ("true", b"", True),
+    ("false", b"alpha", False),
+])
+def test_conditions(condition, text, expected):
+    assert (scan(CONDITIONS % condition, text) == ["C"]) is expected
+
+
+# --- matching ---------------------------------------------------------------------
+
+@pytest.mark.parametrize("spec, text, expected", [
+    ('"PowerShell"', b"run PowerShell now", True),
+    ('"PowerShell"', b"run powershell now", False),
+    ('"PowerShell" nocase', b"run POWERSHELL now", True),
+    ("{ 4D 5A 90 00 }", b"xx MZ\x90\x00 yy", True),
+    ("{ 4D 5A ?? 00 }", b"xx MZ\x41\x00 yy", True),
+    ("{ 4D 5A ?? 00 }", b"xx MZ\x41\x01 yy", False),
+    ("/evil[0-9]+\\.exe/", b"get evil42.exe", True),
+    ("/evil[0-9]+\\.exe/", b"get evil.exe", False),
+    ("/EVIL[0-9]+/i", b"get evil42.exe", True),
+    ("/(\\-\\-\\-\\-)?abc/", b"zzz abc zzz", True),
+    ("/(\\-\\-\\-\\-)?abc/", b"zzz ----abc zzz", True),
+    ("/\\x4d\\x5a[0-9]+pe/", b"xx MZ12pe", True),
+    ("/[0-9]{4}-[0-9]{2}/", b"on 2024-06", True),
+    ("/a.b/s", b"a\nb", True),
+    ("/a.b/", b"a\nb", False),
+])
+def test_string_matching(spec, text, expected):
+    assert (scan(one_string_rule(spec), text) == ["R"]) is expected
+
+
+@pytest.mark.parametrize("spec, needle", [
+    ('"split-across-chunks"', b"split-across-chunks"),
+    ("{ 4D 5A ?? 00 50 45 }", b"MZ\x90\x00PE"),
+    ("/down(load)?string/", b"downloadstring"),
+])
+def test_match_spans_chunk_boundary(spec, needle):
+    rules = one_string_rule(spec)
+    for cut in range(1, len(needle)):
+        assert scan(rules, b"x" * 1000 + needle[:cut], needle[cut:] + b"y" * 1000) == ["R"]
+
+
+def test_common_anchor_falls_back_to_full_search():
+    # More than RULE_CANDIDATE_LIMIT anchor hits in one chunk.
+    text = b"ab " * (main.RULE_CANDIDATE_LIMIT * 4) + b"abcdef"
+    assert scan(one_string_rule('"abcdef"'), text) == ["R"]
+    assert scan(one_string_rule('"abcdeg"'), text) == []
+
+
+def test_hits_report_strings():
+    scanner = RuleSet(parse_rules(CONDITIONS % "any of them")).scanner()
+    scanner.update(b"alpha and charlie")
+    (hit,) = scanner.finish()
+    assert hit["rule"] == "C"
+    assert hit["strings"] == ["$a1", "$c"]
+    assert hit["score"] == 10
+
+
+def test_shipped_rules_match_samples():
+    ruleset = main.load_rules(RULES_DIR)
+    scanner = ruleset.scanner()
+    scanner.update(b"powershell.exe -EncodedCommand SQBFAFgA")
+    assert "Encoded_PowerShell" in [hit["rule"] for hit in scanner.finish()]
+    scanner = ruleset.scanner()
+    scanner.update(b"quarterly report, nothing to see here")
+    assert scanner.finish() == []
+
+
+def test_empty_ruleset():
+    scanner = RuleSet([]).scanner()
+    scanner.update(b"anything")
+    assert scanner.finish() == []